@@ -11,15 +11,20 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+from aero_vloc.database_builder import DatabaseBuilder
+from aero_vloc.descriptor_cache import DescriptorCache
 from aero_vloc.feature_matchers import LightGlue, SelaLocal, SuperGlue
 from aero_vloc.geo_referencers import GoogleMapsReferencer, LinearReferencer
 from aero_vloc.homography_estimator import HomographyEstimator
 from aero_vloc.index_searchers import FaissSearcher, SequentialSearcher
+from aero_vloc.lazy_local_features import LazyLocalFeatures
+from aero_vloc.local_feature_store import LocalFeatureStore
 from aero_vloc.localization_pipeline import LocalizationPipeline
 from aero_vloc.map_downloader import MapDownloader
-from aero_vloc.maps import Map
+from aero_vloc.maps import Map, MapPyramid, create_mosaic, pack_map
 from aero_vloc.metrics import reference_recall, retrieval_recall
 from aero_vloc.primitives import UAVSeq
+from aero_vloc.profiler import PROFILER, Profiler
 from aero_vloc.retrieval_system import RetrievalSystem
 from aero_vloc.utils import visualize_matches
 from aero_vloc.vpr_systems import (
@@ -0,0 +1,533 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import hashlib
+import json
+import multiprocessing
+import numpy as np
+import os
+import queue
+import shutil
+import time
+import torch
+import traceback
+
+from itertools import chain
+from pathlib import Path
+from tqdm import tqdm
+from typing import Any, Iterator, Optional, Sequence
+
+from aero_vloc.descriptor_cache import DescriptorCache, get_model_key
+from aero_vloc.feature_matchers import FeatureMatcher
+from aero_vloc.local_feature_store import METADATA_FILENAME, LocalFeatureStore
+from aero_vloc.maps import MapLoader
+from aero_vloc.maps.base_map import BaseMap
+from aero_vloc.vpr_systems import VPRSystem
+
+MANIFEST_FILENAME = "manifest.jsonl"
+GLOBAL_DESCS_FILENAME = "global_descs.npy"
+LOCAL_FEATURES_FOLDER = "local_features"
+
+
+def iterate_descriptors(
+    sat_map: BaseMap,
+    indices: Sequence[int],
+    vpr_system: Optional[VPRSystem],
+    feature_matcher: Optional[FeatureMatcher],
+    batch_size: int = 32,
+    num_workers: int = 0,
+    descriptor_cache: DescriptorCache = None,
+    stats: dict = None,
+) -> Iterator[tuple[Optional[np.ndarray], Optional[Any]]]:
+    """
+    Yields the global descriptors and the local features of the tiles in the order of `indices`.
+    Both are calculated in one pass, so the image files shared by neighboring tiles are decoded once.
+    If the VPR system shares its model with the feature matcher, both are calculated
+    with one forward pass of the model.
+    Only one batch of the calculated values is kept in memory at a time
+
+    :param sat_map: Map of the tiles
+    :param indices: Indices of the tiles
+    :param vpr_system: VPR system. If None, the yielded global descriptors are None
+    :param feature_matcher: Feature matcher. If None, the yielded local features are None
+    :param batch_size: Number of the tiles processed by the VPR system at once
+    :param num_workers: Number of the processes decoding and preprocessing the tiles.
+                        Every worker decodes the image files with its own cache
+    :param descriptor_cache: Persistent cache of the descriptors and the features.
+                             Only the tiles missing in the cache are processed by the models
+    :param stats: Dictionary updated with the statistics of the loading of the tiles
+                  when the iteration is over
+    """
+    indices = list(indices)
+    global_keys, local_keys = None, None
+    missing_descs = [vpr_system is not None] * len(indices)
+    missing_feat = [feature_matcher is not None] * len(indices)
+    if descriptor_cache is not None:
+        if vpr_system is not None:
+            global_keys = descriptor_cache.get_keys(sat_map, vpr_system, indices)
+            missing_descs = [key not in descriptor_cache for key in global_keys]
+        if feature_matcher is not None:
+            local_keys = descriptor_cache.get_keys(sat_map, feature_matcher, indices)
+            missing_feat = [key not in descriptor_cache for key in local_keys]
+    shared = (
+        vpr_system is not None
+        and feature_matcher is not None
+        and vpr_system.shares_features_with(feature_matcher)
+    )
+    # Positions of the tiles in `indices` which should be processed by the models
+    missing = [i for i in range(len(indices)) if missing_descs[i] or missing_feat[i]]
+
+    loader = MapLoader(
+        sat_map,
+        vpr_system.get_preprocessor() if vpr_system is not None else None,
+        batch_size,
+        num_workers,
+        indices=[indices[i] for i in missing],
+    )
+    batches = iter(
+        tqdm(loader, desc="Calculating of descriptors for source DB")
+        if len(missing) > 0
+        else []
+    )
+    calculated_descs, calculated_feat = {}, {}
+    position = 0
+    for i in range(len(indices)):
+        while (missing_descs[i] and i not in calculated_descs) or (
+            missing_feat[i] and i not in calculated_feat
+        ):
+            tensors, images = next(batches)
+            batch = missing[position : position + len(images)]
+            position += len(images)
+            if shared:
+                # Both outputs are calculated with one pass of the shared model
+                descs, features = vpr_system.get_preprocessed_descriptors_and_features(
+                    tensors, batch_size
+                )
+                calculated_descs.update(
+                    (j, desc) for j, desc in zip(batch, descs) if missing_descs[j]
+                )
+                calculated_feat.update(
+                    (j, feat) for j, feat in zip(batch, features) if missing_feat[j]
+                )
+            else:
+                if vpr_system is not None:
+                    descs = vpr_system.get_preprocessed_descriptors(
+                        [t for j, t in zip(batch, tensors) if missing_descs[j]],
+                        batch_size,
+                    )
+                    calculated_descs.update(
+                        zip([j for j in batch if missing_descs[j]], descs)
+                    )
+                if feature_matcher is not None:
+                    for j, image in zip(batch, images):
+                        if missing_feat[j]:
+                            calculated_feat[j] = feature_matcher.get_feature(image)
+            if descriptor_cache is not None:
+                for j in batch:
+                    if missing_descs[j]:
+                        descriptor_cache.put(global_keys[j], calculated_descs[j])
+                    if missing_feat[j]:
+                        descriptor_cache.put(local_keys[j], calculated_feat[j])
+
+        global_desc, local_feature = None, None
+        if vpr_system is not None:
+            if missing_descs[i]:
+                global_desc = calculated_descs.pop(i)
+            else:
+                global_desc = descriptor_cache.get(global_keys[i])
+        if feature_matcher is not None:
+            if missing_feat[i]:
+                local_feature = calculated_feat.pop(i)
+            else:
+                local_feature = descriptor_cache.get(local_keys[i])
+        yield global_desc, local_feature
+
+    # The loader counts the last batch when it is resumed after the batch
+    for _ in batches:
+        pass
+    if stats is not None:
+        stats.update(
+            num_tiles=len(missing),
+            throughput=loader.throughput,
+            overlap=loader.overlap,
+            wait_time=loader.wait_time,
+            process_time=loader.process_time,
+        )
+
+
+def calculate_descriptors(
+    sat_map: BaseMap,
+    indices: Sequence[int],
+    vpr_system: Optional[VPRSystem],
+    feature_matcher: Optional[FeatureMatcher],
+    batch_size: int = 32,
+    num_workers: int = 0,
+    descriptor_cache: DescriptorCache = None,
+) -> tuple[Optional[list], Optional[list], dict]:
+    """
+    Calculates the global descriptors and the local features of the tiles,
+    the parameters are the same as in `iterate_descriptors`
+
+    :return: Global descriptors, local features and statistics of the loading of the tiles
+    """
+    stats = {}
+    global_descs, local_features = [], []
+    for global_desc, local_feature in iterate_descriptors(
+        sat_map,
+        indices,
+        vpr_system,
+        feature_matcher,
+        batch_size,
+        num_workers,
+        descriptor_cache,
+        stats,
+    ):
+        global_descs.append(global_desc)
+        local_features.append(local_feature)
+    return (
+        global_descs if vpr_system is not None else None,
+        local_features if feature_matcher is not None else None,
+        stats,
+    )
+
+
+class DatabaseBuilder:
+    """
+    Resumable build of the global descriptors and the local features of the map.
+    The map is divided into chunks of consecutive tiles, every finished chunk is saved
+    to its own folder and recorded in the append-only manifest.
+    A restarted build skips the recorded chunks. Chunks are independent,
+    so several processes can build different chunks of one map.
+    """
+
+    def __init__(
+        self,
+        path_to_build: Path,
+        sat_map: BaseMap,
+        vpr_system: Optional[VPRSystem],
+        feature_matcher: Optional[FeatureMatcher],
+        chunk_size: int = 1024,
+        batch_size: int = 32,
+        num_workers: int = 0,
+        descriptor_cache: DescriptorCache = None,
+        feature_compression: str = None,
+    ):
+        """
+        :param path_to_build: Folder of the build, it is created if it does not exist
+        :param sat_map: Map of the tiles
+        :param vpr_system: VPR system. If None, the global descriptors are not calculated
+        :param feature_matcher: Feature matcher. If None, the local features are not calculated
+        :param chunk_size: Number of the tiles in one chunk
+        :param batch_size: Number of the tiles processed by the VPR system at once
+        :param num_workers: Number of the processes decoding and preprocessing the tiles
+        :param descriptor_cache: Persistent cache of the descriptors and the features
+        :param feature_compression: Format of the stored descriptors of the local features,
+                                    "float16" or "int8". If None, the descriptors are stored as is
+        """
+        self.path_to_build = Path(path_to_build)
+        self.sat_map = sat_map
+        self.vpr_system = vpr_system
+        self.feature_matcher = feature_matcher
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.descriptor_cache = descriptor_cache
+        self.feature_compression = feature_compression
+        self.num_chunks = -(-len(sat_map) // chunk_size)
+        self.stats = []
+
+        self.path_to_build.mkdir(parents=True, exist_ok=True)
+        self.build_key = self.__get_build_key()
+        path_to_manifest = self.path_to_build / MANIFEST_FILENAME
+        if not path_to_manifest.exists():
+            self.__append_to_manifest({"build_key": self.build_key})
+        with open(path_to_manifest) as file:
+            header = json.loads(file.readline())
+        if header.get("build_key") != self.build_key:
+            raise ValueError(
+                f"{self.path_to_build} contains the build of another map, "
+                f"models, chunk size or compression"
+            )
+
+    def finished_chunks(self) -> set[int]:
+        """
+        :return: Indices of the chunks recorded in the manifest
+        """
+        with open(self.path_to_build / MANIFEST_FILENAME) as file:
+            records = [json.loads(line) for line in file if line.strip()]
+        return {record["chunk"] for record in records if "chunk" in record}
+
+    def pending_chunks(self) -> list[int]:
+        """
+        :return: Indices of the chunks that are not built yet
+        """
+        finished = self.finished_chunks()
+        return [i for i in range(self.num_chunks) if i not in finished]
+
+    def build(self, chunks: Sequence[int] = None):
+        """
+        Builds the pending chunks
+
+        :param chunks: Indices of the chunks to be built, e.g. the shard of the current process.
+                       If None, all the pending chunks are built
+        """
+        finished = self.finished_chunks()
+        chunks = range(self.num_chunks) if chunks is None else chunks
+        for chunk in chunks:
+            if chunk not in finished:
+                self.build_chunk(chunk)
+
+    def build_parallel(
+        self,
+        num_processes: int,
+        threads_per_process: int = None,
+        baseline_throughput: float = None,
+        timeout: float = 60,
+    ) -> dict[str, Any]:
+        """
+        Builds the pending chunks in several forked processes.
+        Every process gets its own copy of the models and builds every `num_processes`-th chunk.
+        It is intended for CPU-only builds, since CUDA cannot be used in the forked processes
+
+        :param num_processes: Number of the processes
+        :param threads_per_process: Number of the torch threads in every process.
+                                    If None, the CPU cores are divided equally between the processes
+        :param baseline_throughput: Throughput of the single-process build in tiles per second,
+                                    e.g. the throughput from `get_stats`. If it is given,
+                                    the speedup of the parallel build is reported
+        :param timeout: Time in seconds given to the processes to exit after sending their results.
+                        The processes still running after it are terminated
+        :return: Statistics of the build including the throughput of every process,
+                 the parallelism, i.e. the average number of the simultaneously busy processes,
+                 and the speedup if the baseline throughput is given
+        """
+        for model in [self.vpr_system, self.feature_matcher]:
+            device = str(getattr(model, "device", "cpu"))
+            if device != "cpu":
+                raise ValueError(
+                    f"Multi-process build requires the models on CPU, "
+                    f"{type(model).__name__} is on {device}"
+                )
+        if threads_per_process is None:
+            threads_per_process = max(1, (os.cpu_count() or 1) // num_processes)
+        pending = self.pending_chunks()
+        shards = [pending[i::num_processes] for i in range(num_processes)]
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        start = time.perf_counter()
+        processes = [
+            context.Process(
+                target=self.__build_shard,
+                args=(worker, shard, threads_per_process, results),
+            )
+            for worker, shard in enumerate(shards)
+        ]
+        for process in processes:
+            process.start()
+        # Results are received before joining, so the full queue does not block the processes
+        received = {}
+        while len(received) < len(processes):
+            try:
+                stats = results.get(timeout=1)
+                received[stats["worker"]] = stats
+            except queue.Empty:
+                # The process killed e.g. by the OOM killer never sends its results
+                self.__check_exit_codes(processes, received)
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                # Results of the process are already received
+                process.terminate()
+                process.join()
+        self.__check_exit_codes(processes, received)
+        wall_time = time.perf_counter() - start
+        workers = list(received.values())
+
+        errors = [worker["error"] for worker in workers if "error" in worker]
+        if len(errors) > 0:
+            raise RuntimeError(f"Build of the shard failed:\n{errors[0]}")
+        workers.sort(key=lambda worker: worker["worker"])
+        num_tiles = sum(worker["num_tiles"] for worker in workers)
+        busy_time = sum(worker["wall_time"] for worker in workers)
+        stats = {
+            "num_processes": num_processes,
+            "threads_per_process": threads_per_process,
+            "num_tiles": num_tiles,
+            "wall_time": wall_time,
+            "throughput": num_tiles / wall_time if wall_time > 0 else 0,
+            "parallelism": busy_time / wall_time if wall_time > 0 else 0,
+            "workers": workers,
+        }
+        if baseline_throughput is not None:
+            stats["speedup"] = stats["throughput"] / baseline_throughput
+        return stats
+
+    @staticmethod
+    def __check_exit_codes(
+        processes: list[multiprocessing.Process], received: dict[int, Any]
+    ):
+        for worker, process in enumerate(processes):
+            if worker not in received and process.exitcode not in (None, 0):
+                for other_process in processes:
+                    other_process.terminate()
+                raise RuntimeError(
+                    f"Process building shard {worker} exited with code {process.exitcode}"
+                )
+
+    def __build_shard(
+        self,
+        worker: int,
+        chunks: list[int],
+        num_threads: int,
+        results: multiprocessing.Queue,
+    ):
+        try:
+            torch.set_num_threads(num_threads)
+            self.stats = []
+            start = time.perf_counter()
+            self.build(chunks)
+            stats = self.get_stats()
+            stats["wall_time"] = time.perf_counter() - start
+            stats["chunks"] = chunks
+        except Exception:
+            stats = {"error": traceback.format_exc()}
+        stats["worker"] = worker
+        results.put(stats)
+
+    def build_chunk(self, chunk: int):
+        """
+        Calculates and saves the descriptors and the features of the tiles of one chunk
+
+        :param chunk: Index of the chunk
+        """
+        start = chunk * self.chunk_size
+        end = min(start + self.chunk_size, len(self.sat_map))
+        global_descs, local_features, stats = calculate_descriptors(
+            self.sat_map,
+            range(start, end),
+            self.vpr_system,
+            self.feature_matcher,
+            self.batch_size,
+            self.num_workers,
+            self.descriptor_cache,
+        )
+        self.stats.append(stats)
+
+        # The chunk is written to the temporary folder and renamed when it is complete
+        path_to_chunk = self.__get_chunk_path(chunk)
+        temporary_path = path_to_chunk.with_name(f"{path_to_chunk.name}.{os.getpid()}")
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        temporary_path.mkdir()
+        if global_descs is not None:
+            np.save(temporary_path / GLOBAL_DESCS_FILENAME, np.stack(global_descs))
+        if local_features is not None:
+            LocalFeatureStore.save(
+                temporary_path / LOCAL_FEATURES_FOLDER,
+                local_features,
+                self.feature_matcher.ragged_axes,
+                self.feature_compression,
+            )
+        shutil.rmtree(path_to_chunk, ignore_errors=True)
+        os.replace(temporary_path, path_to_chunk)
+        self.__append_to_manifest({"chunk": chunk, "start": start, "end": end})
+
+    def iterate_global_descs(self) -> Iterator[np.ndarray]:
+        """
+        Yields the memory-mapped global descriptors of the finished chunks in order,
+        so they can be added to the index without loading all of them at once
+        """
+        self.__check_finished()
+        for chunk in range(self.num_chunks):
+            yield np.load(
+                self.__get_chunk_path(chunk) / GLOBAL_DESCS_FILENAME, mmap_mode="r"
+            )
+
+    def merge_local_features(self) -> LocalFeatureStore:
+        """
+        Merges the local features of the finished chunks into one store
+
+        :return: Store of the local features of the whole map
+        """
+        self.__check_finished()
+        path_to_store = self.path_to_build / LOCAL_FEATURES_FOLDER
+        if not (path_to_store / METADATA_FILENAME).exists():
+            chunk_stores = [
+                LocalFeatureStore(self.__get_chunk_path(chunk) / LOCAL_FEATURES_FOLDER)
+                for chunk in range(self.num_chunks)
+            ]
+            LocalFeatureStore.save(
+                path_to_store,
+                chain.from_iterable(
+                    (store[i] for i in range(len(store))) for store in chunk_stores
+                ),
+                self.feature_matcher.ragged_axes,
+                self.feature_compression,
+            )
+        return LocalFeatureStore(path_to_store)
+
+    def merge(self) -> tuple[Optional[np.ndarray], Optional[LocalFeatureStore]]:
+        """
+        Merges the chunks of the finished build
+
+        :return: Global descriptors and the store of the local features of the whole map
+        """
+        global_descs, local_features = None, None
+        if self.vpr_system is not None:
+            global_descs = np.concatenate(list(self.iterate_global_descs()))
+        if self.feature_matcher is not None:
+            local_features = self.merge_local_features()
+        return global_descs, local_features
+
+    def get_stats(self) -> dict[str, Any]:
+        """
+        :return: Statistics of the tiles processed by this builder
+        """
+        num_tiles = sum(stats["num_tiles"] for stats in self.stats)
+        wait_time = sum(stats["wait_time"] for stats in self.stats)
+        process_time = sum(stats["process_time"] for stats in self.stats)
+        total_time = wait_time + process_time
+        return {
+            "num_tiles": num_tiles,
+            "throughput": num_tiles / total_time if total_time > 0 else 0,
+            "overlap": process_time / total_time if total_time > 0 else 0,
+            "wait_time": wait_time,
+            "process_time": process_time,
+        }
+
+    def __get_build_key(self) -> str:
+        build_hash = hashlib.sha256(
+            f"{len(self.sat_map)}:{self.chunk_size}:{self.feature_compression}".encode()
+        )
+        for model in [self.vpr_system, self.feature_matcher]:
+            model_key = "" if model is None else get_model_key(model)
+            build_hash.update(model_key.encode())
+        for tile in self.sat_map:
+            for line in tile.paths:
+                for path in line:
+                    build_hash.update(self.sat_map.get_source_hash(path).encode())
+            build_hash.update(repr(tile.region_of_interest).encode())
+        return build_hash.hexdigest()
+
+    def __check_finished(self):
+        pending = self.pending_chunks()
+        if len(pending) > 0:
+            raise ValueError(f"Chunks {pending} of the build are not finished")
+
+    def __get_chunk_path(self, chunk: int) -> Path:
+        return self.path_to_build / f"chunk_{chunk:06d}"
+
+    def __append_to_manifest(self, record: dict):
+        # One short write in the append mode is atomic,
+        # so several processes can record their chunks concurrently
+        with open(self.path_to_build / MANIFEST_FILENAME, "a") as file:
+            file.write(json.dumps(record) + "\n")
@@ -0,0 +1,192 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import hashlib
+import numpy as np
+import os
+import torch
+import types
+import weakref
+
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from aero_vloc.maps.base_map import BaseMap
+from aero_vloc.primitives import MapTile
+
+
+def get_weights_hash(model: object) -> str:
+    """
+    Calculates the hash of all the weights and the configuration of the VPR system or the feature matcher.
+    The attributes of the model are traversed recursively including the plain objects storing the modules,
+    e.g. the extractor of AnyLoc, and the modules and tensors are hashed by their values.
+    The configuration of every object is the attributes listed in its `cache_key_attributes`
+
+    :param model: VPR system or feature matcher
+    :return: Hex digest of the weights and the configuration
+    """
+    weights_hash = hashlib.sha256()
+    _update_hash(weights_hash, "", model, set())
+    return weights_hash.hexdigest()
+
+
+def _update_hash(weights_hash, name: str, value: Any, visited: set[int]):
+    if isinstance(value, (torch.nn.Module, torch.Tensor)):
+        # The model shared by several objects, e.g. Sela and its extractor, is hashed once
+        if id(value) in visited:
+            return
+        visited.add(id(value))
+    if isinstance(value, torch.nn.Module):
+        for key, tensor in sorted(value.state_dict().items()):
+            _update_tensor_hash(weights_hash, f"{name}.{key}", tensor)
+    elif isinstance(value, torch.Tensor):
+        _update_tensor_hash(weights_hash, name, value)
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            _update_hash(weights_hash, f"{name}.{index}", item, visited)
+    elif hasattr(value, "__dict__") and not isinstance(
+        value, (type, types.FunctionType, types.MethodType, types.ModuleType)
+    ):
+        if id(value) in visited:
+            return
+        visited.add(id(value))
+        weights_hash.update(f"{name}:{type(value).__name__}".encode())
+        for key in getattr(value, "cache_key_attributes", ()):
+            weights_hash.update(f"{name}.{key}={getattr(value, key)!r}".encode())
+        for key, item in sorted(vars(value).items()):
+            _update_hash(weights_hash, f"{name}.{key}", item, visited)
+
+
+def _update_tensor_hash(weights_hash, name: str, tensor: torch.Tensor):
+    tensor = tensor.detach().cpu().contiguous().reshape(-1)
+    weights_hash.update(f"{name}:{tensor.dtype}".encode())
+    weights_hash.update(tensor.view(torch.uint8).numpy().data)
+
+
+# Keys of the models calculated once per instance
+_MODEL_KEYS = weakref.WeakKeyDictionary()
+
+
+def get_model_key(model: object) -> str:
+    """
+    The key is calculated once per instance of the model,
+    so the weights are expected not to change after the first call
+
+    :param model: VPR system or feature matcher
+    :return: Key identifying the outputs of the model, i.e. the class,
+             the weights and the resize of the images
+    """
+    try:
+        return _MODEL_KEYS[model]
+    except (KeyError, TypeError):
+        pass
+    model_key = "{}:{}:{}".format(
+        type(model).__name__, get_weights_hash(model), getattr(model, "resize", None)
+    )
+    try:
+        _MODEL_KEYS[model] = model_key
+    except TypeError:
+        # Models which are not hashable or weakly referenceable are hashed on every call
+        pass
+    return model_key
+
+
+def get_tile_key(sat_map: BaseMap, tile: MapTile, model_key: str) -> str:
+    """
+    :param sat_map: Map containing the tile
+    :param tile: Tile of the map
+    :param model_key: Key of the model created with `get_model_key`
+    :return: Key depending only on the content of the tile image and the model
+    """
+    tile_hash = hashlib.sha256(model_key.encode())
+    for line in tile.paths:
+        for path in line:
+            tile_hash.update(sat_map.get_source_hash(path).encode())
+        tile_hash.update(b"\n")
+    tile_hash.update(repr(tile.region_of_interest).encode())
+    return tile_hash.hexdigest()
+
+
+class DescriptorCache:
+    """
+    Persistent content-addressed cache of the global descriptors and the local features.
+    Every value is stored in a separate file named by the hash of the tile image
+    and of the model, so the values are reused for the same windows of the different maps
+    and are never returned for the changed images or weights.
+    """
+
+    def __init__(self, path_to_cache: Path):
+        """
+        :param path_to_cache: Folder of the cache, it is created if it does not exist
+        """
+        self.path_to_cache = Path(path_to_cache)
+        self.path_to_cache.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def get_keys(
+        self, sat_map: BaseMap, model: object, indices: Sequence[int] = None
+    ) -> list[str]:
+        """
+        :param sat_map: Map of the tiles
+        :param model: VPR system or feature matcher
+        :param indices: Indices of the tiles. If None, the keys of all the tiles are returned
+        :return: Keys of the tiles
+        """
+        model_key = get_model_key(model)
+        if indices is None:
+            indices = range(len(sat_map))
+        return [get_tile_key(sat_map, sat_map[i], model_key) for i in indices]
+
+    def __contains__(self, key: str) -> bool:
+        path = self.__get_path(key)
+        return path.with_suffix(".npy").exists() or path.with_suffix(".pt").exists()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        :param key: Key of the value
+        :return: Cached value or None if it is missing
+        """
+        path = self.__get_path(key)
+        if path.with_suffix(".npy").exists():
+            self.hits += 1
+            return np.load(path.with_suffix(".npy"))
+        if path.with_suffix(".pt").exists():
+            self.hits += 1
+            return torch.load(path.with_suffix(".pt"))
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any):
+        """
+        Saves the value. Arrays are saved in the NumPy format, other values with torch.save
+
+        :param key: Key of the value
+        :param value: Global descriptor or local features of the tile
+        """
+        path = self.__get_path(key)
+        path.parent.mkdir(exist_ok=True)
+        suffix = ".npy" if isinstance(value, np.ndarray) else ".pt"
+        # The value is written to the temporary file first,
+        # so the interrupted writing does not leave broken values
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "wb") as file:
+            if isinstance(value, np.ndarray):
+                np.save(file, value)
+            else:
+                torch.save(value, file)
+        os.replace(temporary_path, path.with_suffix(suffix))
+
+    def __get_path(self, key: str) -> Path:
+        # Files are distributed over subfolders to keep the folders small
+        return self.path_to_cache / key[:2] / key
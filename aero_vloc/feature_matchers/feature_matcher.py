@@ -19,6 +19,10 @@ from typing import Tuple
 
 
 class FeatureMatcher(ABC):
+    # Axis of the keypoints for every value of the features
+    # whose size depends on the number of keypoints
+    ragged_axes: dict[str, int] = {}
+
     def __init__(self, resize: int | Tuple[int, int], gpu_index: int = 0):
         self.resize = resize
         self.device = f"cuda:{gpu_index}" if torch.cuda.is_available() else "cpu"
@@ -21,6 +21,7 @@ from aero_vloc.feature_matchers import FeatureMatcher
 from aero_vloc.feature_matchers.lightglue.model.lightglue_matcher import (
     LightGlueMatcher,
 )
+from aero_vloc.profiler import PROFILER
 from aero_vloc.utils import transform_image_for_sp
 
 
@@ -30,6 +31,8 @@ class LightGlue(FeatureMatcher):
     matcher with SuperPoint extractor.
     """
 
+    ragged_axes = {"keypoints": 1, "scores": 1, "descriptors": 1}
+
     def __init__(self, resize: int = 800, gpu_index: int = 0):
         """
         :param resize: The size to which the larger side of the image will be reduced while maintaining the aspect ratio
@@ -44,7 +47,7 @@ class LightGlue(FeatureMatcher):
     def get_feature(self, image: np.ndarray):
         img = transform_image_for_sp(image, self.resize).to(self.device)
         shape = img.shape[-2:][::-1]
-        with torch.no_grad():
+        with PROFILER.stage("matcher.extract"), torch.no_grad():
             feats = self.super_point({"image": img})
         feats["descriptors"] = feats["descriptors"].transpose(-1, -2).contiguous()
         feats = {k: v.to("cpu") for k, v in feats.items()}
@@ -68,9 +71,10 @@ class LightGlue(FeatureMatcher):
                 k: (v.to(self.device) if k in keys else v)
                 for k, v in db_feature.items()
             }
-            matches = self.light_glue_matcher(
-                {"image0": query_features, "image1": db_feature}
-            )
+            with PROFILER.stage("matcher.match"):
+                matches = self.light_glue_matcher(
+                    {"image0": query_features, "image1": db_feature}
+                )
             matches = matches["matches"][0]
             points_query = query_features["keypoints"][0][matches[..., 0]].cpu().numpy()
             points_db = db_feature["keypoints"][0][matches[..., 1]].cpu().numpy()
@@ -18,8 +18,10 @@ from pathlib import Path
 
 from aero_vloc.feature_matchers.feature_matcher import FeatureMatcher
 from aero_vloc.feature_matchers.sela.local_similarity import local_sim
+from aero_vloc.profiler import PROFILER
 from aero_vloc.utils import transform_image_for_vpr
-from aero_vloc.vpr_systems.sela.network import GeoLocalizationNet
+from aero_vloc.vpr_systems.sela import Sela
+from aero_vloc.vpr_systems.sela.extractor import SelaExtractor
 
 
 class SelaLocal(FeatureMatcher):
@@ -28,36 +30,44 @@ class SelaLocal(FeatureMatcher):
     re-ranking method.
     """
 
-    def __init__(self, path_to_state_dict: Path, dinov2_path: Path, gpu_index: int = 0):
+    def __init__(
+        self,
+        path_to_state_dict: Path = None,
+        dinov2_path: Path = None,
+        gpu_index: int = 0,
+        sela: Sela = None,
+    ):
         """
         :param path_to_state_dict: Path to the SelaVPR weights
         :param dinov2_path: Path to the DINOv2 (ViT-L/14) foundation model
         :param gpu_index: The index of the GPU to be used
+        :param sela: Sela VPR system whose model should be shared.
+                     If it is given, the weights are not loaded again and the retrieval system
+                     calculates the local features in the same backbone pass as the global descriptors
         """
         super().__init__((61, 61), gpu_index)
 
-        self.model = GeoLocalizationNet(dinov2_path)
-        self.model = self.model.eval().to(self.device)
-
-        state_dict = torch.load(path_to_state_dict)["model_state_dict"]
-        state_dict = {k[7:]: v for k, v in state_dict.items()}
-        self.model.load_state_dict(state_dict)
+        if sela is not None:
+            self.device = sela.device
+            self.extractor = sela.extractor
+        elif path_to_state_dict is None or dinov2_path is None:
+            raise ValueError("Either the paths to the weights or Sela should be given")
+        else:
+            self.extractor = SelaExtractor(path_to_state_dict, dinov2_path, self.device)
+        self.model = self.extractor.model
 
     def get_feature(self, image: np.ndarray):
-        image = transform_image_for_vpr(image, resize=(224, 224))[None, :].to(
-            self.device
-        )
-        with torch.no_grad():
-            local_feat = self.model.local_feat(image)
-        local_feat = local_feat.cpu().numpy()[0]
-        return local_feat
+        image = transform_image_for_vpr(image, resize=(224, 224)).to(self.device)
+        with PROFILER.stage("matcher.extract"), torch.no_grad():
+            return self.extractor.local_features(image[None])[0]
 
     def match_feature(self, query_features, db_features, k_best):
         query_local_features = torch.Tensor(query_features).to(self.device)
         db_features = torch.Tensor(db_features).to(self.device)
-        scores, all_kpts_query, all_kpts_reference = local_sim(
-            query_local_features, db_features, self.device
-        )
+        with PROFILER.stage("matcher.match"):
+            scores, all_kpts_query, all_kpts_reference = local_sim(
+                query_local_features, db_features, self.device
+            )
         rerank_index = scores.cpu().numpy().argsort()[::-1]
         res_indices = rerank_index[:k_best]
 
@@ -53,6 +53,7 @@ from aero_vloc.feature_matchers.feature_matcher import FeatureMatcher
 from aero_vloc.feature_matchers.superglue.model.superglue_matcher import (
     SuperGlueMatcher,
 )
+from aero_vloc.profiler import PROFILER
 from aero_vloc.utils import transform_image_for_sp
 
 
@@ -62,6 +63,8 @@ class SuperGlue(FeatureMatcher):
     matcher with SuperPoint extractor.
     """
 
+    ragged_axes = {"keypoints": 1, "scores": 1, "descriptors": 2}
+
     def __init__(self, path_to_sg_weights, resize=800, gpu_index: int = 0):
         """
         :param path_to_sg_weights: Path to SuperGlue weights
@@ -77,7 +80,7 @@ class SuperGlue(FeatureMatcher):
     def get_feature(self, image: np.ndarray):
         inp = transform_image_for_sp(image, self.resize).to(self.device)
         shape = inp.shape[2:]
-        with torch.no_grad():
+        with PROFILER.stage("matcher.extract"), torch.no_grad():
             features = self.super_point({"image": inp})
         features = {k: v.to("cpu") for k, v in features.items()}
         features["shape"] = shape
@@ -106,7 +109,7 @@ class SuperGlue(FeatureMatcher):
             kpts0 = pred["keypoints0"][0].cpu().numpy()
             kpts1 = pred["keypoints1"][0].cpu().numpy()
 
-            with torch.no_grad():
+            with PROFILER.stage("matcher.match"), torch.no_grad():
                 pred = self.super_glue_matcher(pred)
 
             matches = pred["matches0"][0].cpu().numpy()
@@ -11,6 +11,8 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import numpy as np
+
 from abc import ABC, abstractmethod
 from typing import Tuple
 
@@ -34,3 +36,27 @@ class GeoReferencer(ABC):
         :return: Latitude and longitude of the pixel
         """
         pass
+
+    def get_lat_lon_array(
+        self,
+        corners: np.ndarray,
+        shape: Tuple[int, int],
+        pixels: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Finds geographic coordinates of pixels on several satellite images of the same size
+
+        :param corners: Array of the (top left lat, top left lon, bottom right lat, bottom right lon)
+                        coordinates of the images with shape (N, 4)
+        :param shape: Height and width of the images
+        :param pixels: Pixel coordinates on every image with shape (N, 2)
+        :return: Latitudes and longitudes of the pixels with shape (N, 2)
+        """
+        height, width = shape
+        result = np.empty((len(corners), 2))
+        for i, (corner, pixel) in enumerate(zip(corners, pixels)):
+            map_tile = MapTile(
+                None, *corner, region_of_interest=(0, 0, width - 1, height - 1)
+            )
+            result[i] = self.get_lat_lon(map_tile, pixel)
+        return result
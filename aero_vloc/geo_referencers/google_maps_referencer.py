@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import math
+import numpy as np
 
 from typing import Tuple
 
@@ -82,3 +83,28 @@ class GoogleMapsReferencer(GeoReferencer):
 
         lat, lon = self.__world_to_lat_lon(desired_x, desired_y)
         return lat, lon
+
+    def get_lat_lon_array(
+        self,
+        corners: np.ndarray,
+        shape: Tuple[int, int],
+        pixels: np.ndarray,
+    ) -> np.ndarray:
+        lat, lon = np.radians(corners[:, 0]), corners[:, 1]
+        top_left_x = (lon + 180) * (self.map_size / 360)
+        top_left_y = (
+            (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2
+        ) * self.map_size
+
+        resize = self.img_size * 2
+        desired_x = (
+            top_left_x + (self.map_size * np.abs(pixels[:, 0]) / resize) / self.scale
+        )
+        desired_y = (
+            top_left_y + (self.map_size * np.abs(pixels[:, 1]) / resize) / self.scale
+        )
+
+        lon = desired_x / self.map_size * 360 - 180
+        n = math.pi - 2 * math.pi * desired_y / self.map_size
+        lat = 180 / math.pi * np.arctan(0.5 * (np.exp(n) - np.exp(-n)))
+        return np.stack([lat, lon], axis=1)
@@ -11,6 +11,8 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import numpy as np
+
 from typing import Tuple
 
 from aero_vloc.geo_referencers.geo_referencer import GeoReferencer
@@ -41,3 +43,15 @@ class LinearReferencer(GeoReferencer):
             map_tile.bottom_right_lon - map_tile.top_left_lon
         )
         return lat, lon
+
+    def get_lat_lon_array(
+        self,
+        corners: np.ndarray,
+        shape: Tuple[int, int],
+        pixels: np.ndarray,
+    ) -> np.ndarray:
+        height, width = shape
+        top_left = corners[:, :2]
+        bottom_right = corners[:, 2:]
+        scale = np.abs(pixels[:, ::-1]) / np.array([height, width])
+        return top_left + scale * (bottom_right - top_left)
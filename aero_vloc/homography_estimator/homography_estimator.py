@@ -17,6 +17,7 @@ import numpy as np
 from typing import Optional, Tuple
 
 from aero_vloc.primitives import UAVImage
+from aero_vloc.profiler import PROFILER
 from aero_vloc.utils import get_new_size
 
 
@@ -52,9 +53,10 @@ class HomographyEstimator:
         else:
             raise ValueError("Resize param should be int or Tuple[int, int]")
 
-        M, mask = cv2.findHomography(
-            matched_kpts_query, matched_kpts_reference, cv2.RANSAC, 5.0
-        )
+        with PROFILER.stage("homography.ransac"):
+            M, mask = cv2.findHomography(
+                matched_kpts_query, matched_kpts_reference, cv2.RANSAC, 5.0
+            )
         pts = np.float32(
             [[0, 0], [0, h_new - 1], [w_new - 1, h_new - 1], [w_new - 1, 0]]
         ).reshape(-1, 1, 2)
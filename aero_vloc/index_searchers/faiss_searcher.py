@@ -11,7 +11,6 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-import faiss
 import numpy as np
 
 from aero_vloc.index_searchers.index_searcher import IndexSearcher
@@ -23,11 +22,17 @@ class FaissSearcher(IndexSearcher):
         super().__init__()
 
     def create(self, descriptors: np.ndarray):
-        self.faiss_index = faiss.IndexFlatL2(descriptors.shape[1])
-        self.faiss_index.add(descriptors)
+        self.reset()
+        self.add(descriptors)
 
-    def search(self, descriptor: np.ndarray, k_closest: int) -> list[int]:
-        _, global_predictions_indices = self.faiss_index.search(descriptor, k_closest)
-        global_predictions_indices = global_predictions_indices[0]
+    def search(
+        self,
+        descriptor: np.ndarray,
+        k_closest: int,
+        candidates: np.ndarray = None,
+    ) -> list[int]:
+        global_predictions_indices = self.find_nearest(
+            descriptor, k_closest, candidates
+        )
 
         return global_predictions_indices
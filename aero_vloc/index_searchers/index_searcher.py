@@ -11,6 +11,7 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import faiss
 import numpy as np
 
 
@@ -30,16 +31,63 @@ class IndexSearcher(ABC):
         """
         pass
 
+    def add(self, descriptors: np.ndarray):
+        """
+        Adds descriptors to the index, the index is created on the first call.
+        It allows to fill the index in chunks without keeping all the descriptors in memory
+        :param descriptors: Descriptors with shape (N, D)
+        """
+        descriptors = np.ascontiguousarray(descriptors, dtype=np.float32)
+        if self.faiss_index is None:
+            self.faiss_index = faiss.IndexFlatL2(descriptors.shape[1])
+        self.faiss_index.add(descriptors)
+
+    def reset(self):
+        """
+        Removes all the descriptors from the index
+        """
+        self.faiss_index = None
+
     @abstractmethod
-    def search(self, descriptor: np.ndarray, k_closest: int) -> list[int]:
+    def search(
+        self,
+        descriptor: np.ndarray,
+        k_closest: int,
+        candidates: np.ndarray = None,
+    ) -> list[int]:
         """
         Finds the index of the matched database descriptor
         :param descriptor: Query descriptor
         :param k_closest: Specifies how many predictions should be returned
+        :param candidates: Indices of the descriptors among which the search is performed.
+                           If None, all the descriptors are searched
         :return: Indices of the matched descriptors
         """
         pass
 
+    def find_nearest(
+        self,
+        descriptor: np.ndarray,
+        k_closest: int,
+        candidates: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Finds the nearest descriptors in the index
+        :param descriptor: Query descriptor with shape (1, D)
+        :param k_closest: Specifies how many descriptors should be returned
+        :param candidates: Indices of the descriptors among which the search is performed.
+                           If None, all the descriptors are searched
+        :return: Indices of the nearest descriptors sorted by distance
+        """
+        params = None
+        if candidates is not None:
+            params = faiss.SearchParameters()
+            params.sel = faiss.IDSelectorBatch(np.asarray(candidates, dtype=np.int64))
+        _, indices = self.faiss_index.search(descriptor, k_closest, params=params)
+        indices = indices[0]
+        # Missing neighbors are marked with -1 if there are less than k_closest candidates
+        return indices[indices >= 0]
+
     def end_of_query_seq(self):
         """
         Notifies the indexing system that the sequence from the UAV
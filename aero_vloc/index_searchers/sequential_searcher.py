@@ -11,8 +11,6 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-import faiss
-import itertools
 import numpy as np
 
 from aero_vloc.index_searchers.index_searcher import IndexSearcher
@@ -33,30 +31,37 @@ class SequentialSearcher(IndexSearcher):
         self.sat_map = sat_map
 
     def create(self, descriptors: np.ndarray):
-        self.faiss_index = faiss.IndexFlatL2(descriptors.shape[1])
-        self.faiss_index.add(descriptors)
+        self.reset()
+        self.add(descriptors)
 
-    def search(self, descriptor: np.ndarray, k_closest: int) -> list[int]:
-        _, global_predictions_indices = self.faiss_index.search(descriptor, k_closest)
-        global_predictions_indices = global_predictions_indices[0]
+    def search(
+        self,
+        descriptor: np.ndarray,
+        k_closest: int,
+        candidates: np.ndarray = None,
+    ) -> list[int]:
+        global_predictions_indices = self.find_nearest(
+            descriptor, k_closest, candidates
+        )
         self.computed_query_predictions_indices.append(global_predictions_indices)
 
-        possible_seqs = list(
-            itertools.product(*self.computed_query_predictions_indices[-self.last_n :])
-        )
-        correct_seqs = []
-        for possible_seq in possible_seqs:
-            is_correct = True
-            for prediction_index in possible_seq[1:]:
-                if not (
-                    self.sat_map.are_neighbors(prediction_index, possible_seq[0])
-                    or prediction_index == possible_seq[0]
-                ):
-                    is_correct = False
-                    break
-            if is_correct:
-                correct_seqs.append(possible_seq)
-        predictions_indices = list(
-            set([correct_seq[-1] for correct_seq in correct_seqs])
-        )
+        # A sequence of predictions is correct if all its elements
+        # are equal or adjacent to its first element
+        first_predictions, *next_predictions = self.computed_query_predictions_indices[
+            -self.last_n :
+        ]
+        if not next_predictions:
+            return list(np.unique(first_predictions))
+        first_predictions = np.asarray(first_predictions)[:, None]
+        is_correct_first = np.ones(len(first_predictions), dtype=bool)
+        for predictions in next_predictions:
+            is_compatible = self.sat_map.are_neighbors(
+                predictions[None, :], first_predictions
+            ) | (predictions[None, :] == first_predictions)
+            is_correct_first &= is_compatible.any(axis=1)
+
+        # The last element of the correct sequence is a current prediction
+        # compatible with a correct first element
+        is_correct_last = is_compatible[is_correct_first].any(axis=0)
+        predictions_indices = list(np.unique(next_predictions[-1][is_correct_last]))
         return predictions_indices
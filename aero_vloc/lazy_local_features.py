@@ -0,0 +1,91 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import numpy as np
+
+from tqdm import tqdm
+from typing import Any, Iterable
+
+from aero_vloc.descriptor_cache import DescriptorCache, get_model_key, get_tile_key
+from aero_vloc.feature_matchers import FeatureMatcher
+from aero_vloc.maps.base_map import BaseMap
+from aero_vloc.utils import LRUCache
+
+
+class LazyLocalFeatures:
+    """
+    Local features of the map tiles extracted on the first request.
+    The features of the recently requested tiles are kept in memory.
+    """
+
+    def __init__(
+        self,
+        sat_map: BaseMap,
+        feature_matcher: FeatureMatcher,
+        cache_size: int = 1024,
+        descriptor_cache: DescriptorCache = None,
+    ):
+        """
+        :param sat_map: Map of the tiles
+        :param feature_matcher: Feature matcher extracting the features
+        :param cache_size: Maximum number of the features kept in memory
+        :param descriptor_cache: Persistent cache of the features.
+                                 If it is given, the extracted features are saved to it
+                                 and reused by the following runs
+        """
+        self.sat_map = sat_map
+        self.feature_matcher = feature_matcher
+        self.descriptor_cache = descriptor_cache
+        self.model_key = None
+        if descriptor_cache is not None:
+            self.model_key = get_model_key(feature_matcher)
+        self.features = LRUCache(self.__extract, max_size=cache_size)
+
+    def __len__(self):
+        return len(self.sat_map)
+
+    def __getitem__(self, index) -> Any:
+        """
+        :param index: Index of the tile or the array of indices
+        :return: Features of the tile or the list of features of the tiles.
+                 Dense features of several tiles are stacked into one array
+        """
+        if np.ndim(index) == 0:
+            if not -len(self) <= index < len(self):
+                raise IndexError("Local feature index out of range")
+            return self.features[int(index) % len(self)]
+        features = [self.features[i] for i in np.arange(len(self))[index]]
+        if len(features) > 0 and isinstance(features[0], np.ndarray):
+            return np.stack(features)
+        return features
+
+    def warm_up(self, indices: Iterable[int]):
+        """
+        Extracts the features of the tiles in advance,
+        e.g. of the tiles along the expected route of the UAV
+
+        :param indices: Indices of the tiles
+        """
+        for index in tqdm(indices, desc="Warming up of local features"):
+            _ = self.features[int(index)]
+
+    def __extract(self, index: int) -> Any:
+        if self.descriptor_cache is None:
+            return self.feature_matcher.get_feature(self.sat_map[index].image)
+        tile = self.sat_map[index]
+        key = get_tile_key(self.sat_map, tile, self.model_key)
+        feature = self.descriptor_cache.get(key)
+        if feature is None:
+            feature = self.feature_matcher.get_feature(tile.image)
+            self.descriptor_cache.put(key, feature)
+        return feature
@@ -0,0 +1,296 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import json
+import numpy as np
+import torch
+
+from pathlib import Path
+from typing import Any, Iterable
+
+METADATA_FILENAME = "store.json"
+OFFSETS_FILENAME = "offsets.bin"
+# Dense features (the whole feature is one array) are stored under this key
+DENSE_KEY = "dense"
+COMPRESSIONS = ("float16", "int8")
+
+
+def compress(values: np.ndarray, compression: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compresses the values of the keypoints
+
+    :param values: Values with the keypoints along the first axis
+    :param compression: "float16" or "int8". In the int8 format every vector of the keypoint
+                        is scaled by its own factor, so its maximum absolute value is 127
+    :return: Compressed values and the scale factors of the keypoints (empty for float16)
+    """
+    if compression == "float16":
+        return values.astype(np.float16), np.empty(0, dtype=np.float32)
+    vectors = values.reshape(len(values), int(np.prod(values.shape[1:])))
+    vectors = vectors.astype(np.float32)
+    scales = np.abs(vectors).max(axis=1, initial=0) / 127
+    safe_scales = np.where(scales > 0, scales, 1)
+    quantized = np.round(vectors / safe_scales[:, None]).astype(np.int8)
+    return quantized.reshape(values.shape), scales.astype(np.float32)
+
+
+def decompress(
+    values: np.ndarray, scales: np.ndarray, compression: str, dtype: str
+) -> np.ndarray:
+    """
+    Restores the values compressed with `compress`
+
+    :param values: Compressed values with the keypoints along the first axis
+    :param scales: Scale factors of the keypoints
+    :param compression: "float16" or "int8"
+    :param dtype: Original type of the values
+    :return: Values of the original type
+    """
+    if compression == "float16":
+        return values.astype(dtype)
+    scales = scales.reshape((-1,) + (1,) * (values.ndim - 1))
+    return (values.astype(np.float32) * scales).astype(dtype)
+
+
+class LocalFeatureWriter:
+    """
+    Appends the local features of the tiles to the flat files of the store.
+    The values with the variable number of keypoints are concatenated along the keypoint axis,
+    other values are stacked.
+    """
+
+    def __init__(
+        self,
+        path_to_store: Path,
+        ragged_axes: dict[str, int],
+        compression: str = None,
+        compressed_keys: tuple[str, ...] = ("descriptors",),
+    ):
+        """
+        :param path_to_store: Folder of the store, it is created if it does not exist
+        :param ragged_axes: Axis of the keypoints for every ragged value of the features
+        :param compression: Format of the compressed ragged values, "float16" or "int8".
+                            If None, the values are stored as is
+        :param compressed_keys: Ragged values to be compressed
+        """
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}")
+        self.path_to_store = Path(path_to_store)
+        self.path_to_store.mkdir(parents=True, exist_ok=True)
+        self.ragged_axes = ragged_axes
+        self.compression = compression
+        self.compressed_keys = compressed_keys
+        self.entries = None
+        self.files = {}
+        self.offsets = [0]
+        self.dense = None
+
+    def append(self, feature: dict[str, Any] | np.ndarray):
+        """
+        :param feature: Local features of the tile returned by the feature matcher
+        """
+        self.dense = isinstance(feature, np.ndarray)
+        values = {DENSE_KEY: feature} if self.dense else feature
+        if self.entries is None:
+            self.entries = {
+                key: self.__describe(key, value) for key, value in values.items()
+            }
+        num_keypoints = None
+        for key, value in values.items():
+            entry = self.entries[key]
+            if entry["mode"] == "size":
+                array = np.asarray(value, dtype=np.int64)
+            else:
+                array = value.numpy() if isinstance(value, torch.Tensor) else value
+            if entry["mode"] == "ragged":
+                array = np.moveaxis(array, entry["axis"], 0)
+                if num_keypoints is not None and num_keypoints != len(array):
+                    raise ValueError("Ragged values have different number of keypoints")
+                num_keypoints = len(array)
+            if list(array.shape[entry["mode"] == "ragged" :]) != entry["shape"]:
+                raise ValueError(f"Unexpected shape {array.shape} of {key}")
+            if entry.get("compression") is not None:
+                array, scales = compress(array, entry["compression"])
+                if entry["compression"] == "int8":
+                    self.__get_file(f"{key}.scales").write(scales.tobytes())
+            self.__get_file(key).write(np.ascontiguousarray(array).tobytes())
+        self.offsets.append(self.offsets[-1] + (num_keypoints or 0))
+
+    def close(self):
+        """
+        Writes the offsets and the description of the store
+        """
+        for file in self.files.values():
+            file.close()
+        np.asarray(self.offsets, dtype=np.int64).tofile(
+            self.path_to_store / OFFSETS_FILENAME
+        )
+        metadata = {
+            "num_features": len(self.offsets) - 1,
+            "dense": bool(self.dense),
+            "entries": self.entries or {},
+        }
+        with open(self.path_to_store / METADATA_FILENAME, "w") as file:
+            json.dump(metadata, file)
+
+    def __describe(self, key: str, value: Any) -> dict:
+        if isinstance(value, torch.Size):
+            return {"mode": "size", "dtype": "int64", "shape": [len(value)]}
+        array = value.numpy() if isinstance(value, torch.Tensor) else value
+        entry = {
+            "mode": "stacked",
+            "tensor": isinstance(value, torch.Tensor),
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+        }
+        if key in self.ragged_axes:
+            axis = self.ragged_axes[key]
+            entry["mode"] = "ragged"
+            entry["axis"] = axis
+            entry["shape"] = np.delete(array.shape, axis).tolist()
+            if self.compression is not None and key in self.compressed_keys:
+                entry["compression"] = self.compression
+                entry["original_dtype"] = entry["dtype"]
+                entry["dtype"] = np.dtype(self.compression).str
+        return entry
+
+    def __get_file(self, key: str):
+        if key not in self.files:
+            self.files[key] = open(self.path_to_store / f"{key}.bin", "wb")
+        return self.files[key]
+
+
+class LocalFeatureStore:
+    """
+    Read-only store of the local features of the map tiles.
+    The values are memory-mapped, so only the features of the requested tiles are read from disk.
+    """
+
+    def __init__(self, path_to_store: Path):
+        """
+        :param path_to_store: Folder of the store created with `LocalFeatureStore.save`
+        """
+        self.path_to_store = Path(path_to_store)
+        with open(self.path_to_store / METADATA_FILENAME) as file:
+            metadata = json.load(file)
+        self.num_features = metadata["num_features"]
+        self.dense = metadata["dense"]
+        self.entries = metadata["entries"]
+        self.offsets = np.fromfile(self.path_to_store / OFFSETS_FILENAME, np.int64)
+        self.values = {key: self.__map(key) for key in self.entries}
+        self.scales = self.__map_scales()
+
+    @staticmethod
+    def save(
+        path_to_store: Path,
+        features: Iterable[dict[str, Any] | np.ndarray],
+        ragged_axes: dict[str, int],
+        compression: str = None,
+    ) -> "LocalFeatureStore":
+        """
+        Saves the local features of the tiles to the store
+
+        :param path_to_store: Folder of the store
+        :param features: Local features of the tiles returned by the feature matcher
+        :param ragged_axes: Axis of the keypoints for every ragged value of the features,
+                            i.e. `ragged_axes` of the feature matcher
+        :param compression: Format of the compressed descriptors, "float16" or "int8".
+                            If None, the descriptors are stored as is
+        :return: Opened store
+        """
+        writer = LocalFeatureWriter(path_to_store, ragged_axes, compression)
+        for feature in features:
+            writer.append(feature)
+        writer.close()
+        return LocalFeatureStore(path_to_store)
+
+    def __len__(self):
+        return self.num_features
+
+    def __getitem__(self, index) -> Any:
+        """
+        :param index: Index of the tile or the array of indices
+        :return: Features of the tile or the list of features of the tiles.
+                 Dense features of several tiles are stacked into one array
+        """
+        if np.ndim(index) == 0:
+            if not -len(self) <= index < len(self):
+                raise IndexError("Local feature index out of range")
+            return self.__read(int(index) % len(self))
+        indices = np.arange(len(self))[index]
+        if self.dense:
+            return np.array(self.values[DENSE_KEY][indices])
+        return [self.__read(i) for i in indices]
+
+    def __getstate__(self):
+        # Memory maps are reopened instead of copying their content
+        state = self.__dict__.copy()
+        del state["values"]
+        del state["scales"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.values = {key: self.__map(key) for key in self.entries}
+        self.scales = self.__map_scales()
+
+    def __read(self, index: int) -> dict[str, Any] | np.ndarray:
+        feature = {}
+        start, end = self.offsets[index], self.offsets[index + 1]
+        for key, entry in self.entries.items():
+            if entry["mode"] == "ragged":
+                value = np.array(self.values[key][start:end])
+                if entry.get("compression") is not None:
+                    # Only the values of the requested tile are decompressed
+                    value = decompress(
+                        value,
+                        self.scales[key][start:end],
+                        entry["compression"],
+                        entry["original_dtype"],
+                    )
+                value = np.moveaxis(value, 0, entry["axis"])
+            else:
+                value = np.array(self.values[key][index])
+            if entry["mode"] == "size":
+                value = torch.Size(value.tolist())
+            elif entry["tensor"]:
+                value = torch.from_numpy(value)
+            feature[key] = value
+        return feature[DENSE_KEY] if self.dense else feature
+
+    def __map_scales(self) -> dict[str, np.ndarray]:
+        scales = {}
+        for key, entry in self.entries.items():
+            if entry.get("compression") == "int8" and self.offsets[-1] > 0:
+                scales[key] = np.memmap(
+                    self.path_to_store / f"{key}.scales.bin",
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(int(self.offsets[-1]),),
+                )
+            else:
+                scales[key] = np.empty(0, dtype=np.float32)
+        return scales
+
+    def __map(self, key: str) -> np.ndarray:
+        entry = self.entries[key]
+        length = self.offsets[-1] if entry["mode"] == "ragged" else self.num_features
+        shape = (int(length), *entry["shape"])
+        if np.prod(shape) == 0:
+            return np.empty(shape, dtype=entry["dtype"])
+        return np.memmap(
+            self.path_to_store / f"{key}.bin",
+            dtype=entry["dtype"],
+            mode="r",
+            shape=shape,
+        )
@@ -15,6 +15,7 @@ from typing import Optional, Tuple
 
 from aero_vloc.homography_estimator import HomographyEstimator
 from aero_vloc.primitives import UAVSeq
+from aero_vloc.profiler import PROFILER
 from aero_vloc.retrieval_system import RetrievalSystem
 
 
@@ -45,36 +46,39 @@ class LocalizationPipeline:
         """
         localization_results = []
         for query_image in query_seq:
-            (
-                res_prediction,
-                matched_kpts_query,
-                matched_kpts_reference,
-            ) = self.retrieval_system(
-                query_image, k_closest, feature_matcher_k_closest=1
-            )
+            with PROFILER.stage("pipeline.retrieval"):
+                (
+                    res_prediction,
+                    matched_kpts_query,
+                    matched_kpts_reference,
+                ) = self.retrieval_system(
+                    query_image, k_closest, feature_matcher_k_closest=1
+                )
 
             res_prediction = res_prediction[0]
             matched_kpts_query = matched_kpts_query[0]
             matched_kpts_reference = matched_kpts_reference[0]
 
             chosen_sat_image = self.retrieval_system.sat_map[res_prediction]
-            estimator_result = self.homography_estimator(
-                matched_kpts_query,
-                matched_kpts_reference,
-                query_image,
-                self.retrieval_system.feature_matcher.resize,
-            )
+            with PROFILER.stage("pipeline.homography"):
+                estimator_result = self.homography_estimator(
+                    matched_kpts_query,
+                    matched_kpts_reference,
+                    query_image,
+                    self.retrieval_system.feature_matcher.resize,
+                )
             if estimator_result is None:
                 localization_results.append(None)
                 continue
-            (
-                latitude,
-                longitude,
-            ) = self.retrieval_system.sat_map.geo_referencer.get_lat_lon(
-                chosen_sat_image,
-                estimator_result,
-                self.retrieval_system.feature_matcher.resize,
-            )
+            with PROFILER.stage("pipeline.georeference"):
+                (
+                    latitude,
+                    longitude,
+                ) = self.retrieval_system.sat_map.geo_referencer.get_lat_lon(
+                    chosen_sat_image,
+                    estimator_result,
+                    self.retrieval_system.feature_matcher.resize,
+                )
             localization_results.append((latitude, longitude))
         self.retrieval_system.end_of_query_seq()
         return localization_results
@@ -12,3 +12,8 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 from aero_vloc.maps.map import Map
+from aero_vloc.maps.map_archive import MapArchive, pack_map
+from aero_vloc.maps.map_loader import MapLoader
+from aero_vloc.maps.map_pyramid import MapPyramid
+from aero_vloc.maps.mosaic import create_mosaic
+from aero_vloc.maps.tile_index import TileIndex
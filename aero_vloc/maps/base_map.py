@@ -11,11 +11,45 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import hashlib
+import json
 import numpy as np
 
+from functools import cached_property
 from pathlib import Path
 
-from aero_vloc.primitives.map_tile import MapTile
+from aero_vloc.maps.map_archive import MapArchive, is_map_archive
+from aero_vloc.maps.tile_index import TileIndex
+from aero_vloc.primitives import MapTile, Mosaic
+from aero_vloc.utils import LRUCache, read_image
+
+MOSAIC_FILENAME = "mosaic.npy"
+# Record of the image files of the mosaic written by `create_mosaic`
+MOSAIC_SOURCES_FILENAME = "mosaic_sources.json"
+
+# Offsets of the neighboring tiles in the (Y, X) format
+NEIGHBOR_OFFSETS = np.array(
+    [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+)
+
+
+def get_grid_shape(tiles: list[MapTile]) -> tuple[int, int]:
+    """
+    Finds the number of tiles by height and by width
+    assuming the tiles are ordered row by row
+
+    :param tiles: Tiles of the map
+    :return: Number of tiles by height and by width
+    """
+    width = None
+    for i, tile in enumerate(tiles[1:]):
+        if tile.top_left_lat != tiles[i].top_left_lat:
+            width = i + 1
+            break
+    if width is None:
+        width = len(tiles)
+    height = int(len(tiles) / width)
+    return height, width
 
 
 class BaseMap:
@@ -24,7 +58,9 @@ class BaseMap:
     It is assumed that the map is divided into non-overlapping tiles.
     """
 
-    def __init__(self, path_to_metadata: Path):
+    def __init__(
+        self, path_to_metadata: Path, cache_size: int = None, use_mosaic: bool = True
+    ):
         """
         Reads map from metadata file.
         File format -- sequence of lines, each line is a single tile.
@@ -32,12 +68,30 @@ class BaseMap:
         The format of a line is as follows:
         `filename top_left_lat top_left_lon bottom_right_lat bottom_right_lon`
 
-        :param path_to_metadata: Path to the metadata file
+        If the folder of the metadata file contains a mosaic created with `create_mosaic`,
+        the images of the tiles are read from it instead of the image files.
+        The mosaic is refused if the image files changed after it was created.
+        The map archive created with `pack_map` can be passed instead of the metadata file.
+
+        :param path_to_metadata: Path to the metadata file or to the map archive
+        :param cache_size: Maximum number of decoded image files shared by the tiles of the map.
+                           If None, one row of the map is cached
+        :param use_mosaic: If False, the images are read from the image files even if the mosaic exists
         """
+        self.archive = None
+        if is_map_archive(path_to_metadata):
+            self.archive = MapArchive(path_to_metadata)
+            self.tile_cache = LRUCache(self.archive.read, max_size=1)
+            # Paths of the images are resolved inside the archive
+            map_folder = path_to_metadata
+            lines = self.archive.metadata.splitlines()[1:]
+        else:
+            self.tile_cache = LRUCache(read_image, max_size=1)
+            map_folder = path_to_metadata.parents[0]
+            with open(path_to_metadata) as file:
+                lines = file.readlines()[1:]
+
         tiles = []
-        map_folder = path_to_metadata.parents[0]
-        with open(path_to_metadata) as file:
-            lines = file.readlines()[1:]
         for line in lines:
             (
                 filename,
@@ -46,40 +100,124 @@ class BaseMap:
                 bottom_right_lat,
                 bottom_right_lon,
             ) = line.split()
+            path = map_folder / filename
+            region_of_interest = None
+            if self.archive is not None:
+                # The shape of the image is known from the index of the archive
+                height, width = self.archive.read_shape(path)
+                region_of_interest = (0, 0, width - 1, height - 1)
             map_tile = MapTile(
-                [[map_folder / filename]],
+                [[path]],
                 float(top_left_lat),
                 float(top_left_lon),
                 float(bottom_right_lat),
                 float(bottom_right_lon),
+                region_of_interest=region_of_interest,
+                tile_cache=self.tile_cache,
             )
             tiles.append(map_tile)
-        self.tiles = tiles
-        height, width = self.shape
-        tile_height, tile_width = self.tiles[0].shape
+        self.corners = np.array(
+            [
+                [
+                    tile.top_left_lat,
+                    tile.top_left_lon,
+                    tile.bottom_right_lat,
+                    tile.bottom_right_lon,
+                ]
+                for tile in tiles
+            ]
+        ).reshape(-1, 4)
+        height, width = get_grid_shape(tiles)
+        self.tile_cache.max_size = width if cache_size is None else cache_size
+
+        self.mosaic = None
+        path_to_mosaic = path_to_metadata.parents[0] / MOSAIC_FILENAME
+        if use_mosaic and self.archive is None and path_to_mosaic.exists():
+            paths = [tile.paths[0][0] for tile in tiles]
+            self.mosaic = Mosaic(path_to_mosaic, paths, width)
+            self.__check_mosaic_sources(path_to_mosaic, paths)
+            for tile in tiles:
+                tile.mosaic = self.mosaic
+
+        tile_height, tile_width = tiles[0].shape
         self.pixel_shape = height * tile_height, width * tile_width
+        self.source_hashes = {}
+        # The tiles are set last, so the subclasses can derive their tiles from the finished ones
+        self.tiles = tiles
 
-    @property
+    def __check_mosaic_sources(self, path_to_mosaic: Path, paths: list[Path]):
+        path_to_sources = path_to_mosaic.with_name(MOSAIC_SOURCES_FILENAME)
+        if not path_to_sources.exists():
+            raise ValueError(
+                f"Mosaic {path_to_mosaic} has no record of its image files, "
+                "recreate it with create_mosaic"
+            )
+        with open(path_to_sources) as file:
+            record = json.load(file)
+        if [source["filename"] for source in record["sources"]] != [
+            path.name for path in paths
+        ]:
+            raise ValueError(f"Mosaic {path_to_mosaic} was created for another map")
+        if tuple(record["tile_shape"]) != (
+            self.mosaic.tile_height,
+            self.mosaic.tile_width,
+        ):
+            raise ValueError(f"Shape of the mosaic {path_to_mosaic} is changed")
+        for source, path in zip(record["sources"], paths):
+            # Original image files and the files placed next to the mosaic are checked
+            for source_path in {Path(source["path"]), Path(path).resolve()}:
+                if not source_path.exists():
+                    continue
+                stat = source_path.stat()
+                if (stat.st_size, stat.st_mtime_ns) != (
+                    source["size"],
+                    source["mtime_ns"],
+                ):
+                    raise ValueError(
+                        f"Image file {source_path} changed after the mosaic {path_to_mosaic} "
+                        "was created, recreate it with create_mosaic"
+                    )
+
+    @cached_property
     def shape(self) -> tuple[int, int]:
         """
         :return: Number of tiles by height and by width
         """
-        width = None
-        for i, tile in enumerate(self.tiles[1:]):
-            if tile.top_left_lat != self.tiles[i].top_left_lat:
-                width = i + 1
-                break
-        if width is None:
-            width = len(self.tiles)
-        height = int(len(self.tiles) / width)
-        return height, width
+        return get_grid_shape(self.tiles)
+
+    @cached_property
+    def spatial_index(self) -> TileIndex:
+        """
+        :return: Spatial index for finding tiles by geographic coordinates
+        """
+        return TileIndex(self.corners)
 
     @property
     def tiles_2d(self) -> np.ndarray:
         """
         :return: Reshaped map based on the number of tiles in height and width
         """
-        return np.array(self.tiles).reshape(self.shape)
+        tiles = np.empty(len(self), dtype=object)
+        tiles[:] = list(self)
+        return tiles.reshape(self.shape)
+
+    def get_source_hash(self, path: Path) -> str:
+        """
+        Calculates the hash of the content of the image file of the map.
+        Hashes are calculated once and kept in memory
+
+        :param path: Path to the image file from the metadata
+        :return: Hex digest of the content
+        """
+        if path not in self.source_hashes:
+            if self.archive is not None:
+                content = self.archive.read_blob(path)
+            elif self.mosaic is not None:
+                content = np.ascontiguousarray(self.mosaic.read([[path]])).data
+            else:
+                content = Path(path).read_bytes()
+            self.source_hashes[path] = hashlib.sha256(content).hexdigest()
+        return self.source_hashes[path]
 
     def __iter__(self):
         for map_tile in self.tiles:
@@ -91,6 +229,26 @@ class BaseMap:
     def __len__(self):
         return len(self.tiles)
 
+    def neighbors_of(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns the indexes of neighboring tiles for several tiles at once
+
+        :param indices: Indices of the tiles for which you need to find neighbors
+        :return: Array of neighboring tile indices with shape (N, 8).
+                 Missing neighbors of the tiles on the map border are equal to -1
+        """
+        height, width = self.shape
+        y, x = np.divmod(np.asarray(indices).reshape(-1, 1), width)
+        neighbors_x = x + NEIGHBOR_OFFSETS[:, 1]
+        neighbors_y = y + NEIGHBOR_OFFSETS[:, 0]
+        is_inside = (
+            (0 <= neighbors_x)
+            & (neighbors_x < width)
+            & (0 <= neighbors_y)
+            & (neighbors_y < height)
+        )
+        return np.where(is_inside, neighbors_y * width + neighbors_x, -1)
+
     def get_neighboring_tiles(self, query_index: int) -> list[int]:
         """
         Returns the indexes of neighboring tiles
@@ -98,26 +256,20 @@ class BaseMap:
         :param query_index: Index of the tile for which you need to find neighbors
         :return: Neighboring tile indices
         """
-        height, width = self.shape
-        x, y = query_index % width, query_index // width
-        potential_neighbors = [
-            (x - 1, y - 1),
-            (x, y - 1),
-            (x + 1, y - 1),
-            (x - 1, y),
-            (x + 1, y),
-            (x - 1, y + 1),
-            (x, y + 1),
-            (x + 1, y + 1),
-        ]
-
-        result_neighbors = []
-        for x, y in potential_neighbors:
-            if (0 <= x < width) and (0 <= y < height):
-                result_neighbors.append(width * y + x)
-        return result_neighbors
-
-    def are_neighbors(self, index_1: int, index_2: int) -> bool:
-        """Checks if given tiles are adjacent"""
-        neighbors = self.get_neighboring_tiles(index_1)
-        return index_2 in neighbors
+        neighbors = self.neighbors_of(query_index)[0]
+        return neighbors[neighbors >= 0].tolist()
+
+    def are_neighbors(
+        self, index_1: int | np.ndarray, index_2: int | np.ndarray
+    ) -> bool | np.ndarray:
+        """
+        Checks if given tiles are adjacent.
+        Arrays of indices are compared element-wise with broadcasting.
+        """
+        width = self.shape[1]
+        y_1, x_1 = np.divmod(index_1, width)
+        y_2, x_2 = np.divmod(index_2, width)
+        result = np.maximum(np.abs(x_1 - x_2), np.abs(y_1 - y_2)) == 1
+        if np.ndim(result) == 0:
+            return bool(result)
+        return result
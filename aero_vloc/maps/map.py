@@ -11,11 +11,36 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
+import numpy as np
+
 from pathlib import Path
 
 from aero_vloc.geo_referencers import GeoReferencer
 from aero_vloc.primitives.map_tile import MapTile
-from aero_vloc.maps.base_map import BaseMap
+from aero_vloc.maps.base_map import BaseMap, get_grid_shape
+
+
+def get_axis_windows(
+    map_size: int, old_tile_size: int, new_tile_size: int, step: int
+) -> np.ndarray:
+    """
+    Finds the new tiles along one axis of the map
+
+    :param map_size: Size of the map in pixels
+    :param old_tile_size: Size of the old tiles in pixels
+    :param new_tile_size: Size of the new tiles in pixels
+    :param step: Distance between the neighboring new tiles in pixels
+    :return: Array of the new tiles in the (global start, index of the first involved old tile,
+             index of the last involved old tile, local start, local end) format.
+             Local coordinates are given in the first involved tile coordinate system
+    """
+    start = np.arange(0, map_size - new_tile_size + 1, step)
+    end = start + new_tile_size - 1
+    first_index = start // old_tile_size
+    last_index = end // old_tile_size
+    local_start = start - first_index * old_tile_size
+    local_end = end - first_index * old_tile_size
+    return np.stack([start, first_index, last_index, local_start, local_end], axis=1)
 
 
 class Map(BaseMap):
@@ -23,6 +48,7 @@ class Map(BaseMap):
     The class represents the satellite map required for UAV localization.
     Based on the BaseMap class, it allows
     to specify an arbitrary level of overlap and zoom level.
+    The new tiles are stored as arrays and MapTile objects are created on demand.
     """
 
     def __init__(
@@ -31,6 +57,7 @@ class Map(BaseMap):
         zoom: float,
         overlap_level: float,
         geo_referencer: GeoReferencer,
+        cache_size: int = None,
     ):
         """
         Reads map from metadata file.
@@ -43,89 +70,162 @@ class Map(BaseMap):
         :param zoom: Zoom Level. For example, a level equal
                      to 0.5 means that the coverage area is doubled.
         :param geo_referencer: Georeference model of the map
+        :param cache_size: Maximum number of decoded image files shared by the tiles of the map.
+                           If None, all the image files involved in one row of the new tiles are cached,
+                           so each file is decoded about once when iterating over the map
         """
         assert zoom > 0
         assert 0 <= overlap_level < 1
-        super().__init__(path_to_metadata)
+        super().__init__(path_to_metadata, cache_size)
         self.geo_referencer = geo_referencer
 
-        old_tile_h, old_tile_w = self.tiles[0].shape
+        source_corners = self.corners
+
+        source_width = self.source_shape[1]
+        old_tile_h, old_tile_w = self.source_tile_shape
         map_pixel_height, map_pixel_width = self.pixel_shape
         new_tile_h, new_tile_w = int(old_tile_h // zoom), int(old_tile_w // zoom)
-        tiles_2d = self.tiles_2d
-
-        # Generating of the new tiles
-        tiles = []
-        for new_top_left_y in range(
-            0, map_pixel_height - new_tile_h + 1, int(new_tile_h * (1 - overlap_level))
-        ):
-            for new_top_left_x in range(
-                0,
-                map_pixel_width - new_tile_w + 1,
-                int(new_tile_w * (1 - overlap_level)),
-            ):
-                # Finding the tiles that should participate in the creation of new ones
-                top_left_index_x, top_left_index_y = (
-                    new_top_left_x // old_tile_w,
-                    new_top_left_y // old_tile_h,
-                )
-                new_bottom_right_x, new_bottom_right_y = (
-                    new_top_left_x + new_tile_w - 1,
-                    new_top_left_y + new_tile_h - 1,
-                )
-                bottom_right_index_x, bottom_right_index_y = (
-                    new_bottom_right_x // old_tile_w,
-                    new_bottom_right_y // old_tile_h,
-                )
-                involved_tiles = tiles_2d[
-                    top_left_index_y : bottom_right_index_y + 1,
-                    top_left_index_x : bottom_right_index_x + 1,
-                ]
-
-                # Finding the global pixel coordinates of the top left involved tile
-                old_top_left_x, old_top_left_y = (
-                    top_left_index_x * old_tile_w,
-                    top_left_index_y * old_tile_h,
-                )
-                # Finding the coordinates of a tile in the involved tiles coordinate system
-                top_left_local_x, top_left_local_y = (
-                    new_top_left_x - old_top_left_x,
-                    new_top_left_y - old_top_left_y,
-                )
-                bottom_right_local_x, bottom_right_local_y = (
-                    new_bottom_right_x - old_top_left_x,
-                    new_bottom_right_y - old_top_left_y,
-                )
-
-                top_left_lat, top_left_lon = self.geo_referencer.get_lat_lon(
-                    involved_tiles[0, 0], (top_left_local_x, top_left_local_y)
-                )
-                # We also need to find the coordinates of the bottom right corner
-                # in the bottom right involved tile coordinate system for georeferencing
-                bottom_right_lat, bottom_right_lon = self.geo_referencer.get_lat_lon(
-                    involved_tiles[-1, -1],
-                    (
-                        new_bottom_right_x - bottom_right_index_x * old_tile_w,
-                        new_bottom_right_y - bottom_right_index_y * old_tile_h,
-                    ),
-                )
-
-                paths_to_tiles = [
-                    [tile.paths[0][0] for tile in line] for line in involved_tiles
-                ]
-                tiles.append(
-                    MapTile(
-                        paths_to_tiles,
-                        top_left_lat,
-                        top_left_lon,
-                        bottom_right_lat,
-                        bottom_right_lon,
-                        (
-                            top_left_local_x,
-                            top_left_local_y,
-                            bottom_right_local_x,
-                            bottom_right_local_y,
-                        ),
-                    )
-                )
-        self.tiles = tiles
+        if cache_size is None:
+            # A new tile can span one extra row of the old tiles if it is not aligned with them
+            rows_per_tile = (new_tile_h - 1) // old_tile_h + 2
+            self.tile_cache.max_size = rows_per_tile * source_width
+
+        # Generating of the new tiles along each axis
+        self.windows_y = get_axis_windows(
+            map_pixel_height,
+            old_tile_h,
+            new_tile_h,
+            int(new_tile_h * (1 - overlap_level)),
+        )
+        self.windows_x = get_axis_windows(
+            map_pixel_width,
+            old_tile_w,
+            new_tile_w,
+            int(new_tile_w * (1 - overlap_level)),
+        )
+
+        # Georeferencing of the corners of all the new tiles at once.
+        # Arrays of the Y axis are columns and arrays of the X axis are rows,
+        # so their combinations give values for every new tile
+        _, top_left_index_y, bottom_right_index_y, top_left_local_y, _ = (
+            self.windows_y.T[:, :, None]
+        )
+        _, top_left_index_x, bottom_right_index_x, top_left_local_x, _ = (
+            self.windows_x.T[:, None, :]
+        )
+        top_left_source = top_left_index_y * source_width + top_left_index_x
+        top_left_pixels = np.broadcast_arrays(top_left_local_x, top_left_local_y)
+
+        # We also need to find the coordinates of the bottom right corner
+        # in the bottom right involved tile coordinate system for georeferencing
+        bottom_right_source = bottom_right_index_y * source_width + bottom_right_index_x
+        bottom_right_pixels = np.broadcast_arrays(
+            top_left_local_x
+            + new_tile_w
+            - 1
+            - (bottom_right_index_x - top_left_index_x) * old_tile_w,
+            top_left_local_y
+            + new_tile_h
+            - 1
+            - (bottom_right_index_y - top_left_index_y) * old_tile_h,
+        )
+
+        self.corners = np.hstack(
+            [
+                self.geo_referencer.get_lat_lon_array(
+                    source_corners[top_left_source.ravel()],
+                    self.source_tile_shape,
+                    np.stack(top_left_pixels, axis=-1).reshape(-1, 2),
+                ),
+                self.geo_referencer.get_lat_lon_array(
+                    source_corners[bottom_right_source.ravel()],
+                    self.source_tile_shape,
+                    np.stack(bottom_right_pixels, axis=-1).reshape(-1, 2),
+                ),
+            ]
+        )
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """
+        :return: Number of tiles by height and by width
+        """
+        return len(self.windows_y), len(self.windows_x)
+
+    @property
+    def tiles(self) -> list[MapTile]:
+        """
+        :return: Tiles of the map. They are created on every access,
+                 so iterating over the map or indexing it is cheaper
+        """
+        return list(self)
+
+    @tiles.setter
+    def tiles(self, source_tiles: list[MapTile]):
+        # The tiles of the base map are the source of the new ones and are not kept
+        self.source_shape = get_grid_shape(source_tiles)
+        self.source_tile_shape = source_tiles[0].shape
+        self.source_paths = [tile.paths[0][0] for tile in source_tiles]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if isinstance(key, (list, tuple, np.ndarray)):
+            return [self[i] for i in np.asarray(key).ravel()]
+        if not isinstance(key, (int, np.integer)):
+            raise TypeError(
+                "Map indices must be integers, slices or sequences of integers, "
+                f"not {type(key).__name__}"
+            )
+        if not -len(self) <= key < len(self):
+            raise IndexError("Map tile index out of range")
+        row, column = divmod(int(key) % len(self), len(self.windows_x))
+        (
+            _,
+            top_left_index_y,
+            bottom_right_index_y,
+            top_left_local_y,
+            bottom_right_local_y,
+        ) = self.windows_y[row]
+        (
+            _,
+            top_left_index_x,
+            bottom_right_index_x,
+            top_left_local_x,
+            bottom_right_local_x,
+        ) = self.windows_x[column]
+        source_width = self.source_shape[1]
+        paths_to_tiles = [
+            self.source_paths[
+                y * source_width
+                + top_left_index_x : y * source_width
+                + bottom_right_index_x
+                + 1
+            ]
+            for y in range(top_left_index_y, bottom_right_index_y + 1)
+        ]
+        top_left_lat, top_left_lon, bottom_right_lat, bottom_right_lon = self.corners[
+            int(key)
+        ]
+        return MapTile(
+            paths_to_tiles,
+            float(top_left_lat),
+            float(top_left_lon),
+            float(bottom_right_lat),
+            float(bottom_right_lon),
+            (
+                int(top_left_local_x),
+                int(top_left_local_y),
+                int(bottom_right_local_x),
+                int(bottom_right_local_y),
+            ),
+            tile_cache=self.tile_cache,
+            mosaic=self.mosaic,
+        )
+
+    def __len__(self):
+        return len(self.windows_y) * len(self.windows_x)
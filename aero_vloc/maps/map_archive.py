@@ -0,0 +1,137 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import cv2
+import json
+import mmap
+import numpy as np
+import struct
+
+from pathlib import Path
+from tqdm import tqdm
+
+from aero_vloc.utils import read_image_shape
+
+ARCHIVE_MAGIC = b"AVLOCMAP"
+# Magic, offset and length of the index
+ARCHIVE_HEADER = struct.Struct("<8sQQ")
+
+
+def is_map_archive(path: Path) -> bool:
+    """Checks if the file is a packed map archive"""
+    with open(path, "rb") as file:
+        return file.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+
+class MapArchive:
+    """
+    The class represents the map packed into one file.
+    The file consists of the header, encoded images of the tiles
+    written one after another and the index with the metadata of the map.
+    """
+
+    def __init__(self, path_to_archive: Path):
+        """
+        :param path_to_archive: Path to the archive created with `pack_map`
+        """
+        self.path_to_archive = path_to_archive
+        with open(path_to_archive, "rb") as file:
+            magic, index_offset, index_length = ARCHIVE_HEADER.unpack(
+                file.read(ARCHIVE_HEADER.size)
+            )
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"{path_to_archive} is not a map archive")
+            file.seek(index_offset)
+            index = json.loads(file.read(index_length))
+        self.metadata = index["metadata"]
+        # Every entry consists of the offset, length, height and width of the image
+        self.entries = index["entries"]
+        self.__open()
+
+    def __open(self):
+        # Memory mapping allows concurrent reads without seeking on every platform
+        with open(self.path_to_archive, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get_entry(self, path: Path) -> list[int]:
+        filename = Path(path).relative_to(self.path_to_archive).as_posix()
+        return self.entries[filename]
+
+    def read_blob(self, path: Path) -> bytes:
+        """
+        :return: Encoded image of the tile as it is stored in the archive
+        """
+        offset, length, _, _ = self.get_entry(path)
+        return self.mmap[offset : offset + length]
+
+    def read(self, path: Path) -> np.ndarray:
+        """
+        Decodes the image of the tile directly from the mapped archive
+
+        :param path: Path to the image file inside the archive
+        :return: Image in the OpenCV format
+        """
+        offset, length, _, _ = self.get_entry(path)
+        blob = np.frombuffer(self.mmap, dtype=np.uint8, count=length, offset=offset)
+        return cv2.imdecode(blob, cv2.IMREAD_COLOR)
+
+    def read_shape(self, path: Path) -> tuple[int, int]:
+        """
+        :return: Height and width of the image of the tile
+        """
+        _, _, height, width = self.get_entry(path)
+        return height, width
+
+    def __getstate__(self):
+        # Memory mappings cannot be shared between processes
+        state = self.__dict__.copy()
+        del state["mmap"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__open()
+
+
+def pack_map(path_to_metadata: Path, path_to_archive: Path) -> Path:
+    """
+    Packs the map folder into one archive file.
+    The archive can be opened with BaseMap or Map instead of the metadata file.
+
+    :param path_to_metadata: Path to the metadata file of the map
+    :param path_to_archive: Path to the archive file to be created
+    :return: Path to the archive
+    """
+    map_folder = path_to_metadata.parents[0]
+    with open(path_to_metadata) as file:
+        metadata = file.read()
+    filenames = [line.split()[0] for line in metadata.splitlines()[1:] if line]
+
+    entries = {}
+    with open(path_to_archive, "wb") as archive:
+        archive.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, 0, 0))
+        for filename in tqdm(filenames, desc="Packing of the map"):
+            path = map_folder / filename
+            # The image is stored without re-encoding
+            with open(path, "rb") as file:
+                blob = file.read()
+            height, width = read_image_shape(path)
+            entries[filename] = [archive.tell(), len(blob), height, width]
+            archive.write(blob)
+
+        index = json.dumps({"metadata": metadata, "entries": entries}).encode()
+        index_offset = archive.tell()
+        archive.write(index)
+        archive.seek(0)
+        archive.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, index_offset, len(index)))
+    return path_to_archive
@@ -0,0 +1,149 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import numpy as np
+import time
+import torch
+
+from torch.utils.data import DataLoader, Dataset
+from typing import Callable, Iterator, Optional, Sequence
+
+from aero_vloc.maps.base_map import BaseMap
+from aero_vloc.profiler import PROFILER
+
+
+class MapDataset(Dataset):
+    """
+    Dataset of the decoded and preprocessed images of the map tiles
+    """
+
+    def __init__(
+        self,
+        sat_map: BaseMap,
+        preprocess: Optional[Callable[[np.ndarray], torch.Tensor]] = None,
+        indices: Optional[Sequence[int]] = None,
+    ):
+        """
+        :param sat_map: Map to be iterated
+        :param preprocess: Function that transforms the image to the input of the model.
+                           If None, only the images are loaded
+        :param indices: Indices of the tiles to be loaded. If None, all the tiles are loaded
+        """
+        self.sat_map = sat_map
+        self.preprocess = preprocess
+        self.indices = range(len(sat_map)) if indices is None else indices
+
+    def __getitem__(self, index: int) -> tuple[Optional[torch.Tensor], np.ndarray]:
+        with PROFILER.stage("map.decode"):
+            image = self.sat_map[self.indices[index]].image
+        if self.preprocess is None:
+            return None, image
+        with PROFILER.stage("map.preprocess"):
+            return self.preprocess(image), image
+
+    def __len__(self):
+        return len(self.indices)
+
+
+def collate_tiles(
+    items: list[tuple[torch.Tensor, np.ndarray]],
+) -> tuple[list[torch.Tensor], list[np.ndarray]]:
+    # Tensors are not stacked, since the preprocessed tiles can differ in shape
+    tensors, images = zip(*items)
+    return list(tensors), list(images)
+
+
+class MapLoader:
+    """
+    Prefetching loader of the map tiles. The tiles are decoded and preprocessed
+    in the worker processes while the previous batches are processed by the models.
+
+    Every worker has its own copy of the map with its own cache of the decoded image files,
+    and the batches are distributed among the workers in turn. So an image file shared
+    by the tiles of different batches can be decoded by several workers,
+    the files are decoded once only if the tiles are loaded in the main process.
+    The preprocessing function is pickled to every worker, so it should not reference the model.
+    """
+
+    def __init__(
+        self,
+        sat_map: BaseMap,
+        preprocess: Optional[Callable[[np.ndarray], torch.Tensor]] = None,
+        batch_size: int = 32,
+        num_workers: int = 0,
+        prefetch_factor: int = 2,
+        indices: Optional[Sequence[int]] = None,
+    ):
+        """
+        :param sat_map: Map to be iterated
+        :param preprocess: Function that transforms the image to the input of the model.
+                           If None, only the images are loaded
+        :param batch_size: Number of the tiles in one batch
+        :param num_workers: Number of the worker processes.
+                            If 0, the tiles are loaded in the main process
+        :param prefetch_factor: Number of the batches loaded in advance by every worker
+        :param indices: Indices of the tiles to be loaded. If None, all the tiles are loaded
+        """
+        self.loader = DataLoader(
+            MapDataset(sat_map, preprocess, indices),
+            batch_size=batch_size,
+            num_workers=num_workers,
+            collate_fn=collate_tiles,
+            prefetch_factor=prefetch_factor if num_workers > 0 else None,
+            persistent_workers=False,
+        )
+        self.wait_time = 0
+        self.process_time = 0
+        self.num_tiles = 0
+
+    def __iter__(self) -> Iterator[tuple[list[torch.Tensor], list[np.ndarray]]]:
+        """
+        Yields the preprocessed tensors and the original images of the tiles.
+        The time spent on waiting for the batches and on processing them is accumulated
+        """
+        self.wait_time = 0
+        self.process_time = 0
+        self.num_tiles = 0
+        iterator = iter(self.loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                with PROFILER.stage("map.wait"):
+                    tensors, images = next(iterator)
+            except StopIteration:
+                break
+            received = time.perf_counter()
+            self.wait_time += received - start
+            yield tensors, images
+            self.process_time += time.perf_counter() - received
+            self.num_tiles += len(images)
+
+    def __len__(self):
+        return len(self.loader)
+
+    @property
+    def overlap(self) -> float:
+        """
+        :return: Share of the time when the models were busy.
+                 It is close to 1 if loading is completely hidden behind the processing
+        """
+        total_time = self.wait_time + self.process_time
+        return self.process_time / total_time if total_time > 0 else 0
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: Number of the processed tiles per second
+        """
+        total_time = self.wait_time + self.process_time
+        return self.num_tiles / total_time if total_time > 0 else 0
@@ -0,0 +1,146 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import numpy as np
+
+from pathlib import Path
+
+from aero_vloc.geo_referencers import GeoReferencer
+from aero_vloc.maps.map import Map
+
+
+def get_axis_children(coarse_windows: np.ndarray, fine_windows: np.ndarray):
+    """
+    Finds the fine tiles belonging to the coarse tiles along one axis of the map.
+    A fine tile belongs to a coarse tile if its center lies inside the coarse tile.
+    Fine tiles outside all the coarse tiles belong to the coarse tile with the nearest center.
+
+    :param coarse_windows: Coarse tiles in the format returned by `get_axis_windows`
+    :param fine_windows: Fine tiles in the format returned by `get_axis_windows`
+    :return: Boolean matrix with shape (number of coarse tiles, number of fine tiles)
+    """
+    coarse_start = coarse_windows[:, 0, None]
+    coarse_size = coarse_windows[0, 4] - coarse_windows[0, 3] + 1
+    fine_size = fine_windows[0, 4] - fine_windows[0, 3] + 1
+    # Doubled coordinates of the centers keep the calculations in integers
+    fine_center = 2 * fine_windows[None, :, 0] + fine_size - 1
+    is_child = (2 * coarse_start <= fine_center) & (
+        fine_center <= 2 * (coarse_start + coarse_size - 1)
+    )
+
+    is_orphan = ~is_child.any(axis=0)
+    distance = np.abs(2 * coarse_start + coarse_size - 1 - fine_center)
+    nearest = distance[:, is_orphan].argmin(axis=0)
+    is_child[nearest, np.flatnonzero(is_orphan)] = True
+    return is_child
+
+
+class MapPyramid(Map):
+    """
+    The class represents the satellite map with several zoom levels of the same area.
+    The tiles of the map are the tiles of the finest level,
+    the coarser levels allow to narrow down the search with the coarse-to-fine retrieval.
+    """
+
+    def __init__(
+        self,
+        path_to_metadata: Path,
+        zooms: list[float],
+        overlap_level: float,
+        geo_referencer: GeoReferencer,
+        cache_size: int = None,
+    ):
+        """
+        Reads map from metadata file.
+        File format -- sequence of lines, each line is a single tile.
+
+        The format of a line is as follows:
+        `filename top_left_lat top_left_lon bottom_right_lat bottom_right_lon`
+
+        :param path_to_metadata: Path to the metadata file
+        :param zooms: Zoom levels of the pyramid. For example, a level equal
+                      to 0.5 means that the coverage area is doubled.
+                      The largest zoom level is the finest one
+        :param overlap_level: Overlap level of the tiles on every zoom level
+        :param geo_referencer: Georeference model of the map
+        :param cache_size: Maximum number of decoded image files shared by the tiles of all levels
+        """
+        zooms = sorted(zooms)
+        super().__init__(
+            path_to_metadata, zooms[-1], overlap_level, geo_referencer, cache_size
+        )
+        self.zooms = zooms
+        self.levels = []
+        for zoom in zooms[:-1]:
+            level = Map(path_to_metadata, zoom, overlap_level, geo_referencer)
+            if len(level) == 0:
+                raise ValueError(f"Zoom level {zoom} is too small for the map")
+            if cache_size is None:
+                self.tile_cache.max_size = max(
+                    self.tile_cache.max_size, level.tile_cache.max_size
+                )
+            level.tile_cache = self.tile_cache
+            level.mosaic = self.mosaic
+            self.levels.append(level)
+        self.levels.append(self)
+
+        # Parent-child relations between the neighboring levels along each axis
+        self.axis_children = [
+            (
+                get_axis_children(coarse.windows_y, fine.windows_y),
+                get_axis_children(coarse.windows_x, fine.windows_x),
+            )
+            for coarse, fine in zip(self.levels[:-1], self.levels[1:])
+        ]
+
+    def children_of(self, level: int, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns the indexes of the tiles of the next finer level
+        belonging to the given tiles
+
+        :param level: Index of the level of the given tiles, 0 is the coarsest one
+        :param indices: Indices of the tiles on the level
+        :return: Sorted indices of the child tiles on the level `level + 1`
+        """
+        children_y, children_x = self.axis_children[level]
+        fine_width = children_x.shape[1]
+        rows, columns = np.divmod(np.asarray(indices).ravel(), children_x.shape[0])
+        children = [
+            (
+                np.flatnonzero(children_y[row])[:, None] * fine_width
+                + np.flatnonzero(children_x[column])[None, :]
+            ).ravel()
+            for row, column in zip(rows, columns)
+        ]
+        return np.unique(np.concatenate(children, dtype=np.int64))
+
+    def parents_of(self, level: int, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns the indexes of the tiles of the previous coarser level
+        containing the given tiles
+
+        :param level: Index of the level of the given tiles, 0 is the coarsest one
+        :param indices: Indices of the tiles on the level
+        :return: Sorted indices of the parent tiles on the level `level - 1`
+        """
+        children_y, children_x = self.axis_children[level - 1]
+        coarse_width = children_x.shape[0]
+        rows, columns = np.divmod(np.asarray(indices).ravel(), children_x.shape[1])
+        parents = [
+            (
+                np.flatnonzero(children_y[:, row])[:, None] * coarse_width
+                + np.flatnonzero(children_x[:, column])[None, :]
+            ).ravel()
+            for row, column in zip(rows, columns)
+        ]
+        return np.unique(np.concatenate(parents, dtype=np.int64))
@@ -0,0 +1,78 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import json
+import numpy as np
+
+from pathlib import Path
+from tqdm import tqdm
+
+from aero_vloc.maps.base_map import BaseMap, MOSAIC_FILENAME, MOSAIC_SOURCES_FILENAME
+
+
+def create_mosaic(path_to_metadata: Path, folder_to_save: Path) -> Path:
+    """
+    Converts the map to one memory-mapped image.
+    The folder with the mosaic is a map itself and can be opened with BaseMap or Map.
+    The sizes and the modification times of the image files are recorded next to the mosaic,
+    so the mosaic is refused when the image files change.
+
+    :param path_to_metadata: Path to the metadata file of the map
+    :param folder_to_save: Folder for the mosaic and its metadata file
+    :return: Path to the metadata file of the mosaic
+    """
+    # The existing mosaic is replaced, so the images are read from the image files
+    base_map = BaseMap(path_to_metadata, use_mosaic=False)
+    height, width = base_map.shape
+    tile_height, tile_width = base_map[0].shape
+    with open(path_to_metadata) as file:
+        metadata = file.read()
+
+    folder_to_save.mkdir(parents=True, exist_ok=True)
+    mosaic = np.lib.format.open_memmap(
+        folder_to_save / MOSAIC_FILENAME,
+        mode="w+",
+        dtype=np.uint8,
+        shape=(height * tile_height, width * tile_width, 3),
+    )
+    for i, tile in enumerate(tqdm(base_map, desc="Creating of the mosaic")):
+        image = tile.image
+        if image.shape[:2] != (tile_height, tile_width):
+            raise ValueError("All the image files of the map should have the same size")
+        row, column = divmod(i, width)
+        mosaic[
+            row * tile_height : (row + 1) * tile_height,
+            column * tile_width : (column + 1) * tile_width,
+        ] = image
+    mosaic.flush()
+    del mosaic
+
+    sources = []
+    for tile in base_map:
+        path = tile.paths[0][0].resolve()
+        stat = path.stat()
+        sources.append(
+            {
+                "filename": path.name,
+                "path": str(path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+        )
+    with open(folder_to_save / MOSAIC_SOURCES_FILENAME, "w") as file:
+        json.dump({"tile_shape": [tile_height, tile_width], "sources": sources}, file)
+
+    path_to_mosaic_metadata = folder_to_save / path_to_metadata.name
+    with open(path_to_mosaic_metadata, "w") as file:
+        file.write(metadata)
+    return path_to_mosaic_metadata
@@ -0,0 +1,191 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import math
+import numpy as np
+
+# Mean radius of the Earth in meters
+EARTH_RADIUS = 6371008.8
+METERS_PER_DEGREE = math.pi / 180 * EARTH_RADIUS
+
+
+class TileIndex:
+    """
+    Spatial index of the map tiles that finds tiles by geographic coordinates.
+    Tiles are registered in the cells of a uniform grid,
+    so a query only checks the tiles of the cells it touches.
+    """
+
+    def __init__(self, corners: np.ndarray):
+        """
+        :param corners: Array of the (top left lat, top left lon, bottom right lat, bottom right lon)
+                        coordinates of the tiles with shape (N, 4)
+        """
+        corners = np.asarray(corners, dtype=np.float64).reshape(-1, 4)
+        self.lat_min = np.minimum(corners[:, 0], corners[:, 2])
+        self.lat_max = np.maximum(corners[:, 0], corners[:, 2])
+        self.lon_min = np.minimum(corners[:, 1], corners[:, 3])
+        self.lon_max = np.maximum(corners[:, 1], corners[:, 3])
+
+        # The cell size is equal to the typical tile size,
+        # so every tile is registered in a few cells
+        if len(corners) > 0:
+            self.origin = np.array([self.lat_min.min(), self.lon_min.min()])
+            self.cell_size = np.array(
+                [
+                    np.median(self.lat_max - self.lat_min),
+                    np.median(self.lon_max - self.lon_min),
+                ]
+            )
+        else:
+            self.origin = np.zeros(2)
+            self.cell_size = np.ones(2)
+        self.cell_size[self.cell_size <= 0] = 1
+        first_cells = self._get_cells(self.lat_min, self.lon_min)
+        last_cells = self._get_cells(self.lat_max, self.lon_max)
+        self.grid_shape = tuple(last_cells.max(axis=0, initial=0) + 1)
+
+        # Compressed sparse rows: tiles of the cell i are
+        # self.cell_tiles[self.cell_pointers[i] : self.cell_pointers[i + 1]]
+        cells_per_tile = np.prod(last_cells - first_cells + 1, axis=1)
+        tiles = np.repeat(np.arange(len(corners)), cells_per_tile)
+        tile_starts = np.cumsum(cells_per_tile) - cells_per_tile
+        local_index = np.arange(len(tiles)) - np.repeat(tile_starts, cells_per_tile)
+        row_length = (last_cells - first_cells + 1)[tiles, 1]
+        rows = first_cells[tiles, 0] + local_index // row_length
+        columns = first_cells[tiles, 1] + local_index % row_length
+        cells = rows * self.grid_shape[1] + columns
+        order = np.argsort(cells, kind="stable")
+        self.cell_tiles = tiles[order]
+        self.cell_pointers = np.zeros(np.prod(self.grid_shape) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(cells, minlength=np.prod(self.grid_shape)),
+            out=self.cell_pointers[1:],
+        )
+
+    def __len__(self):
+        return len(self.lat_min)
+
+    def _get_cells(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        points = np.stack([lats, lons], axis=-1)
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _get_candidates(
+        self, first_cell: np.ndarray, last_cell: np.ndarray
+    ) -> np.ndarray:
+        first_cell = np.maximum(first_cell, 0)
+        last_cell = np.minimum(last_cell, np.array(self.grid_shape) - 1)
+        if np.any(first_cell > last_cell):
+            return np.empty(0, dtype=np.int64)
+        candidates = [
+            self.cell_tiles[
+                self.cell_pointers[row * self.grid_shape[1] + first_cell[1]] : (
+                    self.cell_pointers[row * self.grid_shape[1] + last_cell[1] + 1]
+                )
+            ]
+            for row in range(first_cell[0], last_cell[0] + 1)
+        ]
+        return np.unique(np.concatenate(candidates))
+
+    def query_points(self, lats: np.ndarray, lons: np.ndarray) -> list[np.ndarray]:
+        """
+        Finds the tiles containing every point
+
+        :param lats: Latitudes of the points
+        :param lons: Longitudes of the points
+        :return: Sorted indices of the tiles for every point
+        """
+        lats = np.asarray(lats, dtype=np.float64).ravel()
+        lons = np.asarray(lons, dtype=np.float64).ravel()
+        cells = self._get_cells(lats, lons)
+        is_inside = np.all((cells >= 0) & (cells < np.array(self.grid_shape)), axis=1)
+        cells = np.where(is_inside, cells[:, 0] * self.grid_shape[1] + cells[:, 1], 0)
+        starts = self.cell_pointers[cells]
+        counts = np.where(is_inside, self.cell_pointers[cells + 1] - starts, 0)
+
+        # All the candidate pairs of points and tiles are checked at once
+        points = np.repeat(np.arange(len(lats)), counts)
+        offsets = np.arange(len(points)) - np.repeat(np.cumsum(counts) - counts, counts)
+        tiles = self.cell_tiles[np.repeat(starts, counts) + offsets]
+        is_contained = (
+            (self.lat_min[tiles] < lats[points])
+            & (lats[points] < self.lat_max[tiles])
+            & (self.lon_min[tiles] < lons[points])
+            & (lons[points] < self.lon_max[tiles])
+        )
+        points, tiles = points[is_contained], tiles[is_contained]
+        order = np.lexsort((tiles, points))
+        splits = np.searchsorted(points[order], np.arange(1, len(lats)))
+        return np.split(tiles[order], splits)
+
+    def query_bbox(
+        self,
+        top_left_lat: float,
+        top_left_lon: float,
+        bottom_right_lat: float,
+        bottom_right_lon: float,
+    ) -> np.ndarray:
+        """
+        Finds the tiles intersecting the bounding box
+
+        :param top_left_lat: Top left latitude of the bounding box
+        :param top_left_lon: Top left longitude of the bounding box
+        :param bottom_right_lat: Bottom right latitude of the bounding box
+        :param bottom_right_lon: Bottom right longitude of the bounding box
+        :return: Sorted indices of the tiles
+        """
+        lat_min, lat_max = sorted((top_left_lat, bottom_right_lat))
+        lon_min, lon_max = sorted((top_left_lon, bottom_right_lon))
+        candidates = self._get_candidates(
+            self._get_cells(lat_min, lon_min), self._get_cells(lat_max, lon_max)
+        )
+        is_intersected = (
+            (self.lat_min[candidates] <= lat_max)
+            & (lat_min <= self.lat_max[candidates])
+            & (self.lon_min[candidates] <= lon_max)
+            & (lon_min <= self.lon_max[candidates])
+        )
+        return candidates[is_intersected]
+
+    def query_radius(self, lat: float, lon: float, radius: float) -> np.ndarray:
+        """
+        Finds the tiles that are closer to the point than the radius.
+        Distances are calculated with the equirectangular approximation.
+
+        :param lat: Latitude of the point
+        :param lon: Longitude of the point
+        :param radius: Radius in meters
+        :return: Sorted indices of the tiles
+        """
+        lat_radius = radius / METERS_PER_DEGREE
+        lon_scale = METERS_PER_DEGREE * math.cos(math.radians(lat))
+        lon_radius = radius / max(lon_scale, 1e-9)
+        candidates = self.query_bbox(
+            lat + lat_radius, lon - lon_radius, lat - lat_radius, lon + lon_radius
+        )
+        lat_distance = np.maximum.reduce(
+            [
+                self.lat_min[candidates] - lat,
+                np.zeros(len(candidates)),
+                lat - self.lat_max[candidates],
+            ]
+        )
+        lon_distance = np.maximum.reduce(
+            [
+                self.lon_min[candidates] - lon,
+                np.zeros(len(candidates)),
+                lon - self.lon_max[candidates],
+            ]
+        )
+        distance = np.hypot(lat_distance * METERS_PER_DEGREE, lon_distance * lon_scale)
+        return candidates[distance <= radius]
@@ -39,21 +39,16 @@ def retrieval_recall(
         recalls = np.zeros(feature_matcher_k_closest)
     else:
         recalls = np.zeros(vpr_k_closest)
-    for uav_image in uav_seq:
+    gt_tiles = retrieval_system.sat_map.spatial_index.query_points(
+        [uav_image.gt_latitude for uav_image in uav_seq],
+        [uav_image.gt_longitude for uav_image in uav_seq],
+    )
+    for uav_image, uav_image_gt_tiles in zip(uav_seq, gt_tiles):
         predictions, _, _ = retrieval_system(
             uav_image, vpr_k_closest, feature_matcher_k_closest
         )
         for i, prediction in enumerate(predictions):
-            map_tile = retrieval_system.sat_map[prediction]
-            if (
-                map_tile.top_left_lat
-                > uav_image.gt_latitude
-                > map_tile.bottom_right_lat
-            ) and (
-                map_tile.top_left_lon
-                < uav_image.gt_longitude
-                < map_tile.bottom_right_lon
-            ):
+            if prediction in uav_image_gt_tiles:
                 recalls[i:] += 1
                 break
 
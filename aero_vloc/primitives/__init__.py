@@ -12,5 +12,6 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 from aero_vloc.primitives.map_tile import MapTile
+from aero_vloc.primitives.mosaic import Mosaic
 from aero_vloc.primitives.uav_image import UAVImage
 from aero_vloc.primitives.uav_seq import UAVSeq
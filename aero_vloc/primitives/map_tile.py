@@ -11,12 +11,14 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-import cv2
 import numpy as np
 
 from functools import cached_property
 from pathlib import Path
 
+from aero_vloc.primitives.mosaic import Mosaic
+from aero_vloc.utils import LRUCache, read_image, read_image_shape
+
 
 class MapTile:
     """
@@ -32,6 +34,8 @@ class MapTile:
         bottom_right_lat: float,
         bottom_right_lon: float,
         region_of_interest: tuple[int, int, int, int] = None,
+        tile_cache: LRUCache = None,
+        mosaic: Mosaic = None,
     ):
         """
         :param paths: 2D list of paths to the image files
@@ -44,6 +48,10 @@ class MapTile:
                                    in the (top left X, top left Y,
                                    bottom right X, bottom right Y) format
                                    If None, no crop is applied
+        :param tile_cache: Cache of decoded image files shared between the tiles of the map.
+                           If None, the image files are decoded on every access
+        :param mosaic: Memory-mapped image of the whole map. If it is given,
+                       the image of the tile is a read-only view into it
         """
         self.paths = paths
         self.top_left_lat = top_left_lat
@@ -51,24 +59,55 @@ class MapTile:
         self.bottom_right_lat = bottom_right_lat
         self.bottom_right_lon = bottom_right_lon
         self.region_of_interest = region_of_interest
+        self.tile_cache = tile_cache
+        self.mosaic = mosaic
 
     @property
     def image(self) -> np.ndarray:
-        horizontal_lines = []
-        for horizontal_line in self.paths:
-            images = [cv2.imread(str(img)) for img in horizontal_line]
-            horizontal_lines.append(np.hstack(images))
-        result = np.vstack(horizontal_lines)
-        if self.region_of_interest is not None:
+        if self.mosaic is not None:
+            return self.mosaic.read(self.paths, self.region_of_interest)
+        images = [[self._read(path) for path in line] for line in self.paths]
+        line_heights = [line[0].shape[0] for line in images]
+        column_widths = [image.shape[1] for image in images[0]]
+        if self.region_of_interest is None:
+            top_left_x, top_left_y = 0, 0
+            bottom_right_x = sum(column_widths) - 1
+            bottom_right_y = sum(line_heights) - 1
+        else:
             (
                 top_left_x,
                 top_left_y,
                 bottom_right_x,
                 bottom_right_y,
             ) = self.region_of_interest
-            result = result[
-                top_left_y : bottom_right_y + 1, top_left_x : bottom_right_x + 1
-            ]
+
+        # Only the parts of the image files covered by the region of interest
+        # are copied into the resulting image
+        first_image = images[0][0]
+        result = np.empty(
+            (bottom_right_y - top_left_y + 1, bottom_right_x - top_left_x + 1)
+            + first_image.shape[2:],
+            dtype=first_image.dtype,
+        )
+        line_y = 0
+        for line, line_height in zip(images, line_heights):
+            top = max(top_left_y, line_y)
+            bottom = min(bottom_right_y + 1, line_y + line_height)
+            if top < bottom:
+                column_x = 0
+                for image, column_width in zip(line, column_widths):
+                    left = max(top_left_x, column_x)
+                    right = min(bottom_right_x + 1, column_x + column_width)
+                    if left < right:
+                        result[
+                            top - top_left_y : bottom - top_left_y,
+                            left - top_left_x : right - top_left_x,
+                        ] = image[
+                            top - line_y : bottom - line_y,
+                            left - column_x : right - column_x,
+                        ]
+                    column_x += column_width
+            line_y += line_height
         return result
 
     @cached_property
@@ -76,5 +115,23 @@ class MapTile:
         """
         :return: Height and width of the tile
         """
-        height, width = self.image.shape[:2]
+        if self.region_of_interest is not None:
+            (
+                top_left_x,
+                top_left_y,
+                bottom_right_x,
+                bottom_right_y,
+            ) = self.region_of_interest
+            return bottom_right_y - top_left_y + 1, bottom_right_x - top_left_x + 1
+        if self.mosaic is not None:
+            height, width = self.image.shape[:2]
+            return height, width
+        # Only the image headers are read, since the images are not cropped
+        height = sum(read_image_shape(line[0])[0] for line in self.paths)
+        width = sum(read_image_shape(path)[1] for path in self.paths[0])
         return height, width
+
+    def _read(self, path: Path) -> np.ndarray:
+        if self.tile_cache is None:
+            return read_image(path)
+        return self.tile_cache[path]
@@ -0,0 +1,89 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import numpy as np
+
+from pathlib import Path
+
+
+class Mosaic:
+    """
+    The class represents the whole satellite map stored as one memory-mapped image.
+    Images of the tiles are returned as views into it without copying.
+    """
+
+    def __init__(self, path_to_mosaic: Path, paths: list[Path], width: int):
+        """
+        :param path_to_mosaic: Path to the mosaic file
+        :param paths: Paths to the image files of the map in the metadata order
+        :param width: Number of the image files by width
+        """
+        self.path_to_mosaic = path_to_mosaic
+        self.image = np.load(path_to_mosaic, mmap_mode="r")
+        height = len(paths) // width
+        if (
+            self.image.ndim != 3
+            or self.image.shape[0] % height != 0
+            or self.image.shape[1] % width != 0
+        ):
+            raise ValueError(
+                f"Shape {self.image.shape} of the mosaic {path_to_mosaic} "
+                f"does not fit the grid of {height}x{width} image files"
+            )
+        self.tile_height = self.image.shape[0] // height
+        self.tile_width = self.image.shape[1] // width
+        self.positions = {path: divmod(i, width) for i, path in enumerate(paths)}
+
+    def read(
+        self,
+        paths: list[list[Path]],
+        region_of_interest: tuple[int, int, int, int] = None,
+    ) -> np.ndarray:
+        """
+        Returns the read-only view of the united image files
+
+        :param paths: 2D list of paths to the image files
+                      according to their actual location
+        :param region_of_interest: Region of the interest of the united image
+                                   in the (top left X, top left Y,
+                                   bottom right X, bottom right Y) format
+        :return: Image of the region
+        """
+        row, column = self.positions[paths[0][0]]
+        top_left_x, top_left_y = column * self.tile_width, row * self.tile_height
+        if region_of_interest is None:
+            return self.image[
+                top_left_y : top_left_y + len(paths) * self.tile_height,
+                top_left_x : top_left_x + len(paths[0]) * self.tile_width,
+            ]
+        (
+            roi_top_left_x,
+            roi_top_left_y,
+            roi_bottom_right_x,
+            roi_bottom_right_y,
+        ) = region_of_interest
+        return self.image[
+            top_left_y + roi_top_left_y : top_left_y + roi_bottom_right_y + 1,
+            top_left_x + roi_top_left_x : top_left_x + roi_bottom_right_x + 1,
+        ]
+
+    def __getstate__(self):
+        # The memory map is reopened instead of copying its content,
+        # so several processes share the same pages
+        state = self.__dict__.copy()
+        del state["image"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.image = np.load(self.path_to_mosaic, mmap_mode="r")
@@ -0,0 +1,147 @@
+#  Copyright (c) 2024, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import json
+import numpy as np
+import os
+import threading
+import time
+
+from contextlib import nullcontext
+from pathlib import Path
+
+# Shared context returned when the profiler is disabled, so nothing is allocated per stage
+NULL_STAGE = nullcontext()
+
+
+class Stage:
+    """
+    Context manager measuring the wall time of one execution of the stage
+    """
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns() - self.start)
+
+
+class Profiler:
+    """
+    Records wall time and number of calls of the named stages
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        :param enabled: If False, the stages are not measured
+        """
+        self.enabled = enabled
+        # Every record is (name, start in ns, duration in ns, process id, thread id)
+        self.records = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Removes all the records"""
+        with self._lock:
+            self.records = []
+
+    def stage(self, name: str):
+        """
+        Measures the stage executed inside the `with` block
+
+        :param name: Name of the stage, e.g. "retrieval.index_search"
+        :return: Context manager
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def record(self, name: str, start: int, duration: int):
+        """
+        Adds the measurement of the stage
+
+        :param name: Name of the stage
+        :param start: Start time of the stage in nanoseconds of `time.perf_counter_ns`
+        :param duration: Duration of the stage in nanoseconds
+        """
+        with self._lock:
+            self.records.append(
+                (name, start, duration, os.getpid(), threading.get_ident())
+            )
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        :return: Number of calls, total time and percentiles of the time of every stage.
+                 Times are in seconds
+        """
+        durations = {}
+        for name, _, duration, _, _ in self.records:
+            durations.setdefault(name, []).append(duration)
+        summary = {}
+        for name, stage_durations in sorted(durations.items()):
+            seconds = np.asarray(stage_durations) / 1e9
+            p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+            summary[name] = {
+                "count": len(seconds),
+                "total": float(seconds.sum()),
+                "mean": float(seconds.mean()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "throughput": len(seconds) / seconds.sum() if seconds.sum() > 0 else 0,
+            }
+        return summary
+
+    def save_json(self, path: Path):
+        """
+        Saves the summary of the stages to the JSON file
+        """
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def save_chrome_trace(self, path: Path):
+        """
+        Saves the records in the Chrome trace format,
+        which can be opened in chrome://tracing or Perfetto
+        """
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1e3,
+                "dur": duration / 1e3,
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, start, duration, pid, tid in self.records
+        ]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+# Profiler shared by all the components of the library, it is disabled by default
+PROFILER = Profiler()
@@ -14,13 +14,17 @@
 import numpy as np
 
 from pathlib import Path
-from typing import Optional, Tuple
-from tqdm import tqdm
+from typing import Iterable, Optional, Tuple
 
+from aero_vloc.database_builder import DatabaseBuilder, iterate_descriptors
+from aero_vloc.descriptor_cache import DescriptorCache
 from aero_vloc.feature_matchers import FeatureMatcher
 from aero_vloc.index_searchers import IndexSearcher
-from aero_vloc.maps import Map
+from aero_vloc.lazy_local_features import LazyLocalFeatures
+from aero_vloc.local_feature_store import LocalFeatureStore
+from aero_vloc.maps import Map, MapPyramid
 from aero_vloc.primitives import UAVImage
+from aero_vloc.profiler import PROFILER
 from aero_vloc.vpr_systems import VPRSystem
 
 
@@ -38,40 +42,163 @@ class RetrievalSystem:
         index_searcher: IndexSearcher,
         path_to_descs: Path = None,
         path_to_feat: Path = None,
+        batch_size: int = 32,
+        num_workers: int = 0,
+        descriptor_cache: DescriptorCache = None,
+        lazy_local_features: bool = False,
+        local_cache_size: int = 1024,
+        path_to_build: Path = None,
+        chunk_size: int = 1024,
+        num_processes: int = 1,
+        baseline_throughput: float = None,
+        feature_compression: str = None,
+        coarse_to_fine: bool = False,
     ):
+        """
+        :param vpr_system: VPR system for the global descriptors
+        :param sat_map: Satellite map of the tiles
+        :param feature_matcher: Feature matcher for the local features
+        :param index_searcher: Index searcher for the global descriptors
+        :param path_to_descs: Path to the precalculated global descriptors of the map.
+                              If None, the descriptors are calculated
+        :param path_to_feat: Path to the precalculated local features of the map,
+                             either the NumPy file or the folder of LocalFeatureStore.
+                             If None, the features are calculated
+        :param batch_size: Number of the tiles processed by the VPR system at once
+        :param num_workers: Number of the processes decoding and preprocessing the tiles
+                            while the models are busy. If 0, the tiles are loaded in the main process.
+                            Every worker has its own cache of the decoded image files,
+                            so the files shared by the tiles can be decoded by several workers
+        :param descriptor_cache: Persistent cache of the descriptors and the features.
+                                 Only the tiles missing in the cache are processed by the models
+        :param lazy_local_features: If True and `path_to_feat` is None, the local features of the tile
+                                    are extracted when the tile becomes the candidate for the first time
+        :param local_cache_size: Maximum number of the lazily extracted local features kept in memory
+        :param path_to_build: Folder of the resumable build of the descriptors and the features.
+                              If it is given, the finished chunks of the tiles are saved to it
+                              and skipped by the restarted build
+        :param chunk_size: Number of the tiles in one chunk of the resumable build
+                           and in one chunk of the descriptors added to the index
+        :param num_processes: Number of the processes building the chunks on CPU.
+                              If it is greater than 1, `path_to_build` is required
+        :param baseline_throughput: Throughput of the single-process build in tiles per second,
+                                    e.g. `build_stats["throughput"]` of the previous build.
+                                    If it is given, the speedup of the multi-process build is reported
+        :param feature_compression: Format of the descriptors of the local features stored by the resumable build,
+                                    "float16" or "int8". The descriptors are decompressed only for the candidates
+        :param coarse_to_fine: If True, the global descriptors of the coarse levels of MapPyramid are calculated
+                               to allow the coarse-to-fine retrieval
+        """
         self.vpr_system = vpr_system
         self.feature_matcher = feature_matcher
         self.sat_map = sat_map
         self.index = index_searcher
+        self.shared_features = vpr_system.shares_features_with(feature_matcher)
 
-        if path_to_descs is None:
-            self.global_descs = []
-            for tile in tqdm(
-                sat_map, desc="Calculating of global descriptors for source DB"
-            ):
-                self.global_descs.append(
-                    self.vpr_system.get_image_descriptor(tile.image)
+        compute_descs = path_to_descs is None
+        compute_feat = path_to_feat is None and not lazy_local_features
+        vpr_to_run = vpr_system if compute_descs else None
+        matcher_to_run = feature_matcher if compute_feat else None
+        if num_processes > 1 and path_to_build is None:
+            raise ValueError("Multi-process build requires path_to_build")
+        # Descriptors are added to the index in chunks as they are produced,
+        # so all of them are stored only in the index
+        self.index.reset()
+        local_features = None
+        if path_to_build is not None:
+            builder = DatabaseBuilder(
+                path_to_build,
+                sat_map,
+                vpr_to_run,
+                matcher_to_run,
+                chunk_size,
+                batch_size,
+                num_workers,
+                descriptor_cache,
+                feature_compression,
+            )
+            if num_processes > 1:
+                self.build_stats = builder.build_parallel(
+                    num_processes, baseline_throughput=baseline_throughput
                 )
-            self.index.create(np.asarray(self.global_descs))
+            else:
+                builder.build()
+                self.build_stats = builder.get_stats()
+            if compute_descs:
+                self.__fill_index(builder.iterate_global_descs(), chunk_size)
+            if compute_feat:
+                local_features = builder.merge_local_features()
         else:
-            self.index.create(np.load(path_to_descs, allow_pickle=True))
-
-        if path_to_feat is None:
+            self.build_stats = {}
             local_features = []
-            for i, tile in enumerate(
-                tqdm(sat_map, desc="Calculating of local features for source DB")
+            descs_chunk = []
+            for global_desc, local_feature in iterate_descriptors(
+                sat_map,
+                range(len(sat_map)),
+                vpr_to_run,
+                matcher_to_run,
+                batch_size,
+                num_workers,
+                descriptor_cache,
+                self.build_stats,
             ):
-                local_features.append(self.feature_matcher.get_feature(tile.image))
+                if compute_descs:
+                    descs_chunk.append(global_desc)
+                    if len(descs_chunk) == chunk_size:
+                        self.index.add(np.stack(descs_chunk))
+                        descs_chunk = []
+                if compute_feat:
+                    local_features.append(local_feature)
+            if len(descs_chunk) > 0:
+                self.index.add(np.stack(descs_chunk))
+
+        if not compute_descs:
+            global_descs = np.load(path_to_descs, mmap_mode="r")
+            self.__check_length(global_descs, path_to_descs)
+            self.__fill_index([global_descs], chunk_size)
+
+        if path_to_feat is None and lazy_local_features:
+            self.source_local_features = LazyLocalFeatures(
+                sat_map, feature_matcher, local_cache_size, descriptor_cache
+            )
+        elif compute_feat and path_to_build is not None:
+            self.source_local_features = local_features
+        elif compute_feat:
             self.source_local_features = np.asarray(local_features)
             del local_features
+        elif Path(path_to_feat).is_dir():
+            # Features are memory-mapped and read only for the candidates of the queries
+            self.source_local_features = LocalFeatureStore(path_to_feat)
+            self.__check_length(self.source_local_features, path_to_feat)
         else:
             self.source_local_features = np.load(path_to_feat, allow_pickle=True)
+            self.__check_length(self.source_local_features, path_to_feat)
+
+        # Coarse levels of the pyramid are used only for the coarse-to-fine retrieval
+        self.coarse_descs = []
+        if coarse_to_fine:
+            if not isinstance(sat_map, MapPyramid):
+                raise ValueError("Coarse-to-fine retrieval requires MapPyramid")
+            for level in sat_map.levels[:-1]:
+                level_descs = iterate_descriptors(
+                    level,
+                    range(len(level)),
+                    vpr_system,
+                    None,
+                    batch_size,
+                    num_workers,
+                    descriptor_cache,
+                )
+                self.coarse_descs.append(
+                    np.stack([global_desc for global_desc, _ in level_descs])
+                )
 
     def __call__(
         self,
         query_image: UAVImage,
         vpr_k_closest: int,
         feature_matcher_k_closest: int | None,
+        coarse_k_closest: int | None = None,
     ) -> Tuple[list, Optional[list], Optional[list]]:
         """
         Retrieves the best matching images using the VPR system and keypoint matcher.
@@ -80,31 +207,122 @@ class RetrievalSystem:
         :param vpr_k_closest: Determines how many best images are to be obtained with the VPR system
         :param feature_matcher_k_closest: Determines how many best images are to be obtained with the feature matcher
         If it is None, then the feature matcher turns off
+        :param coarse_k_closest: Determines how many best tiles are chosen on every coarse level of the map pyramid.
+        Only the children of these tiles are searched on the next level.
+        If it is None, then all the tiles of the finest level are searched with the index searcher.
+        It requires the retrieval system created with `coarse_to_fine=True`
 
         :return: List of predictions,
         list of matched query keypoints for every query -- reference pair (optional),
         list of matched reference keypoints for every query -- reference pair (optional)
         """
-        query_global_desc = np.expand_dims(
-            self.vpr_system.get_image_descriptor(query_image.image), axis=0
-        )
-        global_predictions = self.index.search(query_global_desc, vpr_k_closest)
+        query_local_features = None
+        with PROFILER.stage("retrieval.global_descriptor"):
+            if feature_matcher_k_closest is not None and self.shared_features:
+                # Local features are calculated in the same pass of the shared model
+                descs, features = self.vpr_system.get_image_descriptors_and_features(
+                    [query_image.image]
+                )
+                query_global_desc, query_local_features = descs, features[0]
+            else:
+                query_global_desc = np.expand_dims(
+                    self.vpr_system.get_image_descriptor(query_image.image), axis=0
+                )
+        with PROFILER.stage("retrieval.index_search"):
+            if coarse_k_closest is None:
+                global_predictions = self.index.search(query_global_desc, vpr_k_closest)
+            else:
+                global_predictions = self.__coarse_to_fine_search(
+                    query_global_desc, vpr_k_closest, coarse_k_closest
+                )
 
         if feature_matcher_k_closest is None:
             return global_predictions, None, None
 
-        query_local_features = self.feature_matcher.get_feature(query_image.image)
-        filtered_db_features = self.source_local_features[global_predictions]
-        (
-            local_predictions,
-            matched_kpts_query,
-            matched_kpts_reference,
-        ) = self.feature_matcher.match_feature(
-            query_local_features, filtered_db_features, feature_matcher_k_closest
-        )
+        if query_local_features is None:
+            with PROFILER.stage("retrieval.local_features"):
+                query_local_features = self.feature_matcher.get_feature(
+                    query_image.image
+                )
+        with PROFILER.stage("retrieval.candidate_features"):
+            filtered_db_features = self.source_local_features[global_predictions]
+        with PROFILER.stage("retrieval.matching"):
+            (
+                local_predictions,
+                matched_kpts_query,
+                matched_kpts_reference,
+            ) = self.feature_matcher.match_feature(
+                query_local_features, filtered_db_features, feature_matcher_k_closest
+            )
         res_predictions = global_predictions[local_predictions]
         return res_predictions, matched_kpts_query, matched_kpts_reference
 
+    def __coarse_to_fine_search(
+        self, query_global_desc: np.ndarray, k_closest: int, coarse_k_closest: int
+    ) -> np.ndarray:
+        if len(self.coarse_descs) == 0:
+            raise ValueError(
+                "Coarse-to-fine retrieval requires the retrieval system "
+                "created with coarse_to_fine=True"
+            )
+        candidates = np.arange(len(self.coarse_descs[0]))
+        for level, level_descs in enumerate(self.coarse_descs):
+            best_candidates = self.__search_candidates(
+                query_global_desc, level_descs[candidates], candidates, coarse_k_closest
+            )
+            candidates = self.sat_map.children_of(level, best_candidates)
+        return self.index.search(query_global_desc, k_closest, candidates)
+
+    @staticmethod
+    def __search_candidates(
+        query_global_desc: np.ndarray,
+        candidates_descs: np.ndarray,
+        candidates: np.ndarray,
+        k_closest: int,
+    ) -> np.ndarray:
+        distances = ((candidates_descs - query_global_desc) ** 2).sum(axis=1)
+        return candidates[np.argsort(distances, kind="stable")[:k_closest]]
+
+    def warm_up(self, indices: list[int]):
+        """
+        Extracts the lazy local features of the tiles in advance
+
+        :param indices: Indices of the tiles that are likely to be the candidates
+        """
+        if isinstance(self.source_local_features, LazyLocalFeatures):
+            self.source_local_features.warm_up(indices)
+
+    def save_local_features(
+        self, path_to_store: Path, compression: str = None
+    ) -> LocalFeatureStore:
+        """
+        Saves the local features of the map to LocalFeatureStore,
+        which can be passed as `path_to_feat` later
+
+        :param path_to_store: Folder of the store
+        :param compression: Format of the stored descriptors, "float16" or "int8".
+                            If None, the descriptors are stored as is
+        :return: Opened store
+        """
+        return LocalFeatureStore.save(
+            path_to_store,
+            self.source_local_features,
+            self.feature_matcher.ragged_axes,
+            compression,
+        )
+
+    def __fill_index(self, descriptors: Iterable[np.ndarray], chunk_size: int):
+        for descs in descriptors:
+            for start in range(0, len(descs), chunk_size):
+                self.index.add(descs[start : start + chunk_size])
+
+    def __check_length(self, values: np.ndarray, path: Path):
+        if len(values) != len(self.sat_map):
+            raise ValueError(
+                f"{path} contains {len(values)} values, "
+                f"but the map consists of {len(self.sat_map)} tiles"
+            )
+
     def end_of_query_seq(self):
         """
         Notifies the retrieval system that the sequence from the UAV
@@ -14,11 +14,97 @@
 import cv2
 import numpy as np
 import torch
-import torchvision
 
+import struct
+
+from collections import OrderedDict
 from PIL import Image
 from torchvision.transforms import InterpolationMode
-from typing import Tuple
+from torchvision.transforms.functional import center_crop
+from typing import Callable, Hashable, Tuple
+
+
+class LRUCache:
+    """
+    Size-bounded cache that evicts the least recently used values.
+    Values are computed with the given loader on a cache miss.
+    """
+
+    def __init__(self, loader: Callable, max_size: int):
+        """
+        :param loader: Function that computes the value for a key missing in the cache
+        :param max_size: Maximum number of values kept in the cache
+        """
+        assert max_size > 0
+        self.loader = loader
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def __getitem__(self, key: Hashable):
+        if key in self._values:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return self._values[key]
+        self.misses += 1
+        value = self.loader(key)
+        self._values[key] = value
+        if len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        """Removes all values from the cache and resets the counters"""
+        self._values.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def read_image(path) -> np.ndarray:
+    return cv2.imread(str(path))
+
+
+def read_image_shape(path) -> Tuple[int, int]:
+    """
+    Reads height and width of the image from the PNG or JPEG header
+    without decoding the image. Other formats are decoded completely.
+
+    :param path: Path to the image file
+    :return: Height and width of the image
+    """
+    with open(path, "rb") as file:
+        signature = file.read(24)
+        if signature[:8] == b"\x89PNG\r\n\x1a\n" and signature[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", signature[16:24])
+            return height, width
+        if signature[:2] == b"\xff\xd8":
+            file.seek(2)
+            while True:
+                marker = file.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    break
+                if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                    # Markers without a segment
+                    continue
+                start = file.tell()
+                (length,) = struct.unpack(">H", file.read(2))
+                if marker[1] == 0xE1 and file.read(4) == b"Exif":
+                    # OpenCV applies the EXIF orientation, which can swap the sides
+                    break
+                # SOF markers except DHT, JPG and DAC contain the frame size
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    _, height, width = struct.unpack(">BHH", file.read(5))
+                    return height, width
+                file.seek(start + length)
+    height, width = read_image(path).shape[:2]
+    return height, width
 
 
 def get_new_size(height: int, width: int, resize: int):
@@ -30,27 +116,137 @@ def get_new_size(height: int, width: int, resize: int):
         return height_new, width_new
 
 
+# ImageNet normalization fused into one multiply-add of the pixels in [0, 255]
+_VPR_MEAN = torch.tensor([0.485, 0.456, 0.406])
+_VPR_STD = torch.tensor([0.229, 0.224, 0.225])
+_VPR_SCALE = (1 / (255 * _VPR_STD)).tolist()
+_VPR_SHIFT = -_VPR_MEAN / _VPR_STD
+
+
+# Resampling filters of PIL for the interpolation modes of torchvision
+_PIL_RESAMPLING = {
+    InterpolationMode.NEAREST: Image.Resampling.NEAREST,
+    InterpolationMode.BOX: Image.Resampling.BOX,
+    InterpolationMode.BILINEAR: Image.Resampling.BILINEAR,
+    InterpolationMode.HAMMING: Image.Resampling.HAMMING,
+    InterpolationMode.BICUBIC: Image.Resampling.BICUBIC,
+    InterpolationMode.LANCZOS: Image.Resampling.LANCZOS,
+}
+
+
 def transform_image_for_vpr(
     image: np.ndarray,
     resize: int | Tuple[int, int],
     interpolation: InterpolationMode = InterpolationMode.BILINEAR,
-):
-    image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+) -> torch.Tensor:
+    """
+    Transforms the image to the normalized RGB tensor
+
+    :param image: Image in the OpenCV format
+    :param resize: The size to which the larger side of the image will be reduced
+                   while maintaining the aspect ratio, or the exact size (height, width)
+    :param interpolation: Interpolation of the resize
+    :return: Tensor with shape (3, H, W)
+    """
+    return transform_images_for_vpr([image], resize, interpolation)[0]
+
+
+def transform_images_for_vpr(
+    images: list[np.ndarray],
+    resize: int | Tuple[int, int],
+    interpolation: InterpolationMode = InterpolationMode.BILINEAR,
+) -> torch.Tensor:
+    """
+    Transforms the images of the same shape to the batch of the normalized RGB tensors.
+    The channels are swapped and normalized in one pass written directly to the batch
+
+    :param images: Images in the OpenCV format
+    :param resize: The size to which the larger side of the images will be reduced
+                   while maintaining the aspect ratio, or the exact size (height, width)
+    :param interpolation: Interpolation of the resize
+    :return: Tensor with shape (B, 3, H, W)
+    """
+    height, width = images[0].shape[:2]
+    if any(image.shape[:2] != (height, width) for image in images):
+        raise ValueError("Images of the batch should have the same shape")
+    if interpolation not in _PIL_RESAMPLING:
+        raise ValueError(f"Interpolation {interpolation} is not supported")
     if isinstance(resize, int):
-        h_new, w_new = get_new_size(image.height, image.width, resize)
+        h_new, w_new = get_new_size(height, width, resize)
     else:
         h_new, w_new = resize
-    transform = torchvision.transforms.Compose(
-        [
-            torchvision.transforms.Resize((h_new, w_new), interpolation=interpolation),
-            torchvision.transforms.ToTensor(),
-            torchvision.transforms.Normalize(
-                mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-            ),
-        ]
-    )
-    transformed_image = transform(image)
-    return transformed_image
+    batch = torch.empty((len(images), 3, h_new, w_new), dtype=torch.float32)
+    for image, transformed_image in zip(images, batch):
+        if (h_new, w_new) != (height, width):
+            # Channels are resized independently, so the BGR image is resized as is
+            image = np.array(
+                Image.fromarray(image).resize(
+                    (w_new, h_new), _PIL_RESAMPLING[interpolation]
+                )
+            )
+        pixels = torch.from_numpy(np.require(image, requirements="CW"))
+        for channel in range(3):
+            torch.add(
+                _VPR_SHIFT[channel],
+                pixels[..., 2 - channel],
+                alpha=_VPR_SCALE[channel],
+                out=transformed_image[channel],
+            )
+    return batch
+
+
+class VPRPreprocessor:
+    """
+    Transforms the images to the input of the VPR model.
+    It keeps no reference to the model, so it is cheap to pickle to the loader workers.
+    """
+
+    # Configuration identifying the descriptors in the descriptor cache
+    cache_key_attributes = ("resize", "interpolation", "patch_size")
+
+    def __init__(
+        self,
+        resize: int | Tuple[int, int],
+        interpolation: InterpolationMode = InterpolationMode.BILINEAR,
+        patch_size: int = None,
+    ):
+        """
+        :param resize: The size to which the larger side of the image will be reduced
+                       while maintaining the aspect ratio, or the exact size (height, width)
+        :param interpolation: Interpolation of the resize
+        :param patch_size: If it is given, the image is center-cropped to the multiples of the patch size
+        """
+        self.resize = resize
+        self.interpolation = interpolation
+        self.patch_size = patch_size
+
+    def __call__(self, image: np.ndarray) -> torch.Tensor:
+        """
+        :param image: Image in the OpenCV format
+        :return: Tensor with shape (3, H, W)
+        """
+        image = transform_image_for_vpr(image, self.resize, self.interpolation)
+        return self.__crop(image)
+
+    def transform_batch(self, images: list[np.ndarray]) -> torch.Tensor:
+        """
+        :param images: Images of the same shape in the OpenCV format
+        :return: Tensor with shape (B, 3, H, W)
+        """
+        batch = transform_images_for_vpr(images, self.resize, self.interpolation)
+        return self.__crop(batch)
+
+    def __crop(self, images: torch.Tensor) -> torch.Tensor:
+        if self.patch_size is None:
+            return images
+        height, width = images.shape[-2:]
+        return center_crop(
+            images,
+            [
+                (height // self.patch_size) * self.patch_size,
+                (width // self.patch_size) * self.patch_size,
+            ],
+        )
 
 
 def transform_image_for_sp(image: np.ndarray, resize: int):
@@ -13,12 +13,11 @@
 #  limitations under the License.
 import numpy as np
 import torch
-import torchvision
 
 from pathlib import Path
-from torchvision import transforms as tvf
+from torchvision.transforms import InterpolationMode
 
-from aero_vloc.utils import transform_image_for_vpr
+from aero_vloc.utils import VPRPreprocessor
 from aero_vloc.vpr_systems.vpr_system import VPRSystem
 from aero_vloc.vpr_systems.anyloc.models import DinoV2ExtractFeatures, VLAD
 
@@ -36,6 +35,9 @@ class AnyLoc(VPRSystem):
         """
         super().__init__(gpu_index)
         self.resize = resize
+        self.preprocessor = VPRPreprocessor(
+            resize, InterpolationMode.BICUBIC, patch_size=14
+        )
         self.extractor = DinoV2ExtractFeatures(
             dino_model="dinov2_vitg14", layer=31, facet="value", device=self.device
         )
@@ -43,15 +45,5 @@ class AnyLoc(VPRSystem):
         self.vlad = VLAD(num_clusters=32, desc_dim=None, c_centers_path=c_centers_file)
         self.vlad.fit()
 
-    def get_image_descriptor(self, image: np.ndarray):
-        image = transform_image_for_vpr(
-            image, self.resize, torchvision.transforms.InterpolationMode.BICUBIC
-        ).to(self.device)
-        _, h, w = image.shape
-        h_new, w_new = (h // 14) * 14, (w // 14) * 14
-        img_cropped = tvf.CenterCrop((h_new, w_new))(image)[None, ...]
-        with torch.no_grad():
-            ret = self.extractor(img_cropped)
-        gd = self.vlad.generate(ret.cpu().squeeze())
-        gd_np = gd.numpy()
-        return gd_np
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        return self.vlad.generate_batch(self.extractor(batch)).cpu().numpy()
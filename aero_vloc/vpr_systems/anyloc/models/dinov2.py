@@ -30,6 +30,9 @@ class DinoV2ExtractFeatures:
     Extract features from an intermediate layer in Dino-v2
     """
 
+    # Configuration identifying the features in the descriptor cache
+    cache_key_attributes = ("vit_type", "layer", "facet", "use_cls", "norm_descs")
+
     def __init__(
         self,
         dino_model: _DINO_V2_MODELS,
@@ -50,6 +53,10 @@ class DinoV2ExtractFeatures:
                     Otherwise, only patch descriptors are used.
         - norm_descs:   If True, the descriptors are normalized
         - device:   PyTorch device to use
+
+        The forward pass stops at the requested layer and keeps
+        no state between the calls, so one extractor can be
+        called from several threads at once.
         """
         self.vit_type: str = dino_model
         self.dino_model: nn.Module = torch.hub.load(
@@ -59,24 +66,15 @@ class DinoV2ExtractFeatures:
         self.dino_model = self.dino_model.eval().to(self.device)
         self.layer: int = layer
         self.facet = facet
-        if self.facet == "token":
-            self.fh_handle = self.dino_model.blocks[self.layer].register_forward_hook(
-                self._generate_forward_hook()
-            )
-        else:
-            self.fh_handle = self.dino_model.blocks[
-                self.layer
-            ].attn.qkv.register_forward_hook(self._generate_forward_hook())
+        # Chunked blocks are padded with identities, so they are flattened to be indexed by the layer
+        self.blocks = [
+            block
+            for module in self.dino_model.blocks
+            for block in (module if isinstance(module, nn.ModuleList) else [module])
+            if not isinstance(block, nn.Identity)
+        ]
         self.use_cls = use_cls
         self.norm_descs = norm_descs
-        # Hook data
-        self._hook_out = None
-
-    def _generate_forward_hook(self):
-        def _forward_hook(module, inputs, output):
-            self._hook_out = output
-
-        return _forward_hook
 
     def __call__(self, img: torch.Tensor) -> torch.Tensor:
         """
@@ -84,11 +82,9 @@ class DinoV2ExtractFeatures:
         - img:   The input image
         """
         with torch.no_grad():
-            res = self.dino_model(img)
-            if self.use_cls:
-                res = self._hook_out
-            else:
-                res = self._hook_out[:, 1:, ...]
+            res = self._forward_truncated(img)
+            if not self.use_cls:
+                res = res[:, 1:, ...]
             if self.facet in ["query", "key", "value"]:
                 d_len = res.shape[2] // 3
                 if self.facet == "query":
@@ -99,8 +95,17 @@ class DinoV2ExtractFeatures:
                     res = res[:, :, 2 * d_len :]
         if self.norm_descs:
             res = F.normalize(res, dim=-1)
-        self._hook_out = None  # Reset the hook
         return res
 
-    def __del__(self):
-        self.fh_handle.remove()
+    def _forward_truncated(self, img: torch.Tensor) -> torch.Tensor:
+        """
+        Runs the model up to the requested layer. For the attention facets,
+        the block is stopped after the qkv projection
+        """
+        x = self.dino_model.prepare_tokens_with_masks(img)
+        for block in self.blocks[: self.layer]:
+            x = block(x)
+        block = self.blocks[self.layer]
+        if self.facet == "token":
+            return block(x)
+        return block.attn.qkv(block.norm1(x))
@@ -57,6 +57,15 @@ class VLAD:
         Pattern Recognition. 2013.
     """
 
+    # Configuration identifying the descriptors in the descriptor cache
+    cache_key_attributes = (
+        "num_clusters",
+        "intra_norm",
+        "norm_descs",
+        "vlad_mode",
+        "soft_temp",
+    )
+
     def __init__(
         self,
         num_clusters: int,
@@ -93,42 +102,50 @@ class VLAD:
             print(f"Desc dim set to {self.desc_dim}")
 
     def generate(self, query_descs: Union[np.ndarray, torch.Tensor]) -> torch.Tensor:
-        residuals = self.generate_res_vec(query_descs)
-        # Un-normalized VLAD vector: [c*d,]
-        un_vlad = torch.zeros(self.num_clusters * self.desc_dim)
+        return self.generate_batch(query_descs[None])[0]
+
+    def generate_batch(
+        self, query_descs: Union[np.ndarray, torch.Tensor]
+    ) -> torch.Tensor:
+        """
+        Generates VLAD vectors of several images at once.
+        Sums of the residuals are calculated from the assignments as
+        (sum of descriptors) - (sum of weights) * center,
+        so the residuals of every descriptor to every center are never created.
+
+        :param query_descs: Descriptors with shape [b, q, d]
+        :return: VLAD vectors with shape [b, c*d]
+        """
+        assert self.kmeans is not None
+        assert self.c_centers is not None
+        if type(query_descs) == np.ndarray:
+            query_descs = torch.from_numpy(query_descs).to(torch.float32)
+        b, q, d = query_descs.shape
+        c_centers = self.c_centers.to(query_descs)
+        descs = F.normalize(query_descs, dim=2) if self.norm_descs else query_descs
         if self.vlad_mode == "hard":
-            # Get labels for assignment of descriptors
-            labels = self.kmeans.predict(query_descs)  # [q]
-            # Create VLAD from residuals and labels
-            used_clusters = set(labels.numpy())
-            for k in used_clusters:
-                # Sum of residuals for the descriptors in the cluster
-                #  Shape:[q, c, d]  ->  [q', d] -> [d]
-                cd_sum = residuals[labels == k, k].sum(dim=0)
-                if self.intra_norm:
-                    cd_sum = F.normalize(cd_sum, dim=0)
-                un_vlad[k * self.desc_dim : (k + 1) * self.desc_dim] = cd_sum
+            # Get labels for assignment of descriptors: [b, q]
+            labels = self.kmeans.max_sim(query_descs.reshape(b * q, d), c_centers)[1]
+            labels = labels.view(b, q)
+            # Sums of the descriptors and sizes of the clusters: [b, c, d] and [b, c]
+            cd_sums = torch.zeros(b, self.num_clusters, d).to(descs)
+            cd_sums.scatter_add_(1, labels[..., None].expand(b, q, d), descs)
+            counts = torch.zeros(b, self.num_clusters).to(descs)
+            counts.scatter_add_(1, labels, torch.ones_like(labels).to(descs))
+            cd_sums -= counts[..., None] * c_centers
         else:  # Soft cluster assignment
             # Cosine similarity: 1 = close, -1 = away
-            cos_sims = F.cosine_similarity(  # [q, c]
-                ein.rearrange(query_descs, "q d -> q 1 d"),
-                ein.rearrange(self.c_centers, "c d -> 1 c d"),
-                dim=2,
-            )
-            soft_assign = F.softmax(self.soft_temp * cos_sims, dim=1)
-            # Soft assignment scores (as probabilities): [q, c]
-            for k in range(0, self.num_clusters):
-                w = ein.rearrange(soft_assign[:, k], "q -> q 1 1")
-                # Sum of residuals for all descriptors (for cluster k)
-                cd_sum = ein.rearrange(w * residuals, "q c d -> (q c) d").sum(
-                    dim=0
-                )  # [d]
-                if self.intra_norm:
-                    cd_sum = F.normalize(cd_sum, dim=0)
-                un_vlad[k * self.desc_dim : (k + 1) * self.desc_dim] = cd_sum
+            cos_sims = F.normalize(query_descs, dim=2) @ F.normalize(c_centers, dim=1).T
+            # Soft assignment scores (as probabilities): [b, q, c]
+            soft_assign = F.softmax(self.soft_temp * cos_sims, dim=2)
+            # Weighted residuals of every descriptor to all the centers are summed for cluster k:
+            # c * (sum of w_k * x) - (sum of w_k) * (sum of centers)
+            cd_sums = self.num_clusters * (soft_assign.transpose(1, 2) @ descs)
+            cd_sums -= soft_assign.sum(dim=1)[..., None] * c_centers.sum(dim=0)
+        if self.intra_norm:
+            cd_sums = F.normalize(cd_sums, dim=2)
         # Normalize the VLAD vector
-        n_vlad = F.normalize(un_vlad, dim=0)
-        return n_vlad
+        return F.normalize(cd_sums.reshape(b, self.num_clusters * d), dim=1)
 
     def generate_res_vec(
         self, query_descs: Union[np.ndarray, torch.Tensor]
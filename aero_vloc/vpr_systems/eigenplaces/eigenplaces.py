@@ -14,7 +14,7 @@
 import numpy as np
 import torch
 
-from aero_vloc.utils import transform_image_for_vpr
+from aero_vloc.utils import VPRPreprocessor
 from aero_vloc.vpr_systems.vpr_system import VPRSystem
 
 
@@ -38,6 +38,7 @@ class EigenPlaces(VPRSystem):
         """
         super().__init__(gpu_index)
         self.resize = resize
+        self.preprocessor = VPRPreprocessor(resize)
         self.backbone = backbone
         self.fc_output_dim = fc_output_dim
 
@@ -49,9 +50,5 @@ class EigenPlaces(VPRSystem):
         )
         self.model.eval().to(self.device)
 
-    def get_image_descriptor(self, image: np.ndarray):
-        image = transform_image_for_vpr(image, self.resize)[None, :].to(self.device)
-        with torch.no_grad():
-            descriptor = self.model(image)
-        descriptor = descriptor.cpu().numpy()[0]
-        return descriptor
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        return self.model(batch).cpu().numpy()
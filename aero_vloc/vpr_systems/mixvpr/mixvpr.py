@@ -13,9 +13,10 @@
 #  limitations under the License.
 import numpy as np
 import torch
-import torchvision
 
-from aero_vloc.utils import transform_image_for_vpr
+from torchvision.transforms import InterpolationMode
+
+from aero_vloc.utils import VPRPreprocessor
 from aero_vloc.vpr_systems.vpr_system import VPRSystem
 from aero_vloc.vpr_systems.mixvpr.model.mixvpr_model import VPRModel
 
@@ -31,6 +32,8 @@ class MixVPR(VPRSystem):
         :param gpu_index: The index of the GPU to be used
         """
         super().__init__(gpu_index)
+        # Note that images must be resized to 320x320
+        self.preprocessor = VPRPreprocessor((320, 320), InterpolationMode.BICUBIC)
         self.model = VPRModel(
             backbone_arch="resnet50",
             layers_to_crop=[4],
@@ -51,12 +54,5 @@ class MixVPR(VPRSystem):
         self.model.eval().to(self.device)
         print(f"Loaded model from {ckpt_path} successfully!")
 
-    def get_image_descriptor(self, image: np.ndarray):
-        # Note that images must be resized to 320x320
-        image = transform_image_for_vpr(
-            image, (320, 320), torchvision.transforms.InterpolationMode.BICUBIC
-        )[None, :].to(self.device)
-        with torch.no_grad():
-            descriptor = self.model(image)
-        descriptor = descriptor.cpu().numpy()[0]
-        return descriptor
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        return self.model(batch).cpu().numpy()
@@ -14,7 +14,7 @@
 import numpy as np
 import torch
 
-from aero_vloc.utils import transform_image_for_vpr
+from aero_vloc.utils import VPRPreprocessor
 from aero_vloc.vpr_systems.netvlad.model.models_generic import (
     get_backend,
     get_model,
@@ -36,6 +36,7 @@ class NetVLAD(VPRSystem):
         """
         super().__init__(gpu_index)
         self.resize = resize
+        self.preprocessor = VPRPreprocessor(resize)
         encoder_dim, encoder = get_backend()
 
         checkpoint = torch.load(
@@ -54,12 +55,8 @@ class NetVLAD(VPRSystem):
         self.model = self.model.to(self.device)
         self.model.eval()
 
-    def get_image_descriptor(self, image: np.ndarray):
-        image = transform_image_for_vpr(image, self.resize)[None, :].to(self.device)
-
-        with torch.no_grad():
-            image_encoding = self.model.encoder(image)
-            vlad_global = self.model.pool(image_encoding)
-            vlad_global_pca = get_pca_encoding(self.model, vlad_global)
-            desc = vlad_global_pca.detach().cpu().numpy()[0]
-        return desc
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        image_encoding = self.model.encoder(batch)
+        vlad_global = self.model.pool(image_encoding)
+        vlad_global_pca = get_pca_encoding(self.model, vlad_global)
+        return vlad_global_pca.detach().cpu().numpy()
@@ -14,9 +14,7 @@
 import numpy as np
 import torch
 
-from torchvision import transforms as tvf
-
-from aero_vloc.utils import transform_image_for_vpr
+from aero_vloc.utils import VPRPreprocessor
 from aero_vloc.vpr_systems.vpr_system import VPRSystem
 
 
@@ -36,15 +34,9 @@ class SALAD(VPRSystem):
         """
         super().__init__(gpu_index)
         self.resize = resize
+        self.preprocessor = VPRPreprocessor(resize, patch_size=14)
         self.model = torch.hub.load("serizba/salad", "dinov2_salad")
         self.model.eval().to(self.device)
 
-    def get_image_descriptor(self, image: np.ndarray):
-        image = transform_image_for_vpr(image, self.resize).to(self.device)
-        _, h, w = image.shape
-        h_new, w_new = (h // 14) * 14, (w // 14) * 14
-        img_cropped = tvf.CenterCrop((h_new, w_new))(image)[None, ...]
-        with torch.no_grad():
-            descriptor = self.model(img_cropped)
-        descriptor = descriptor.cpu().numpy()[0]
-        return descriptor
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        return self.model(batch).cpu().numpy()
@@ -0,0 +1,67 @@
+#  Copyright (c) 2024, Feng Lu, Ivan Moskalenko, Anastasiia Kornilova
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+import numpy as np
+import torch
+
+from pathlib import Path
+
+from aero_vloc.vpr_systems.sela.network import GeoLocalizationNet
+
+
+class SelaExtractor:
+    """
+    Sela network shared by the Sela VPR system and the SelaLocal re-ranker.
+    The global descriptors and the local features can be calculated
+    with one backbone pass by `global_local_features`.
+    """
+
+    def __init__(self, path_to_state_dict: Path, dinov2_path: Path, device: str):
+        """
+        :param path_to_state_dict: Path to the SelaVPR weights
+        :param dinov2_path: Path to the DINOv2 (ViT-L/14) foundation model
+        :param device: Device of the model
+        """
+        self.device = device
+        self.model = GeoLocalizationNet(dinov2_path)
+        self.model = self.model.eval().to(device)
+
+        state_dict = torch.load(path_to_state_dict)["model_state_dict"]
+        state_dict = {k[7:]: v for k, v in state_dict.items()}
+        self.model.load_state_dict(state_dict)
+
+    def global_features(self, batch: torch.Tensor) -> np.ndarray:
+        """
+        :param batch: Preprocessed images with shape (B, 3, 224, 224) on the device of the model
+        :return: Global descriptors with shape (B, 1024)
+        """
+        return self.model.global_feat(batch).cpu().numpy()
+
+    def local_features(self, batch: torch.Tensor) -> np.ndarray:
+        """
+        :param batch: Preprocessed images with shape (B, 3, 224, 224) on the device of the model
+        :return: Local features with shape (B, 61, 61, 128)
+        """
+        return self.model.local_feat(batch).cpu().numpy()
+
+    def global_local_features(
+        self, batch: torch.Tensor
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates both outputs with one backbone pass
+
+        :param batch: Preprocessed images with shape (B, 3, 224, 224) on the device of the model
+        :return: Global descriptors with shape (B, 1024) and local features with shape (B, 61, 61, 128)
+        """
+        global_features, local_features = self.model.global_local_feat(batch)
+        return global_features.cpu().numpy(), local_features.cpu().numpy()
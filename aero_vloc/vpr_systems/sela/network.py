@@ -106,20 +106,28 @@ class GeoLocalizationNet(nn.Module):
         self.LocalAdapt = LocalAdapt()
 
     def global_feat(self, x):
+        return self.aggregate_global(self.patch_feat(x))
+
+    def local_feat(self, x):
+        return self.adapt_local(self.patch_feat(x))
+
+    def global_local_feat(self, x):
+        """Runs the backbone once for both the global and the local features"""
+        patch_feature = self.patch_feat(x)
+        return self.aggregate_global(patch_feature), self.adapt_local(patch_feature)
+
+    def patch_feat(self, x):
         x = self.backbone(x)
         patch_feature = x["x_norm_patchtokens"].view(-1, 16, 16, 1024)
+        return patch_feature.permute(0, 3, 1, 2)
 
-        x1 = patch_feature.permute(0, 3, 1, 2)
-        x1 = self.aggregation(x1)
+    def aggregate_global(self, patch_feature):
+        x1 = self.aggregation(patch_feature)
         global_feature = torch.nn.functional.normalize(x1, p=2, dim=-1)
         return global_feature
 
-    def local_feat(self, x):
-        x = self.backbone(x)
-        patch_feature = x["x_norm_patchtokens"].view(-1, 16, 16, 1024)
-
-        x0 = patch_feature.permute(0, 3, 1, 2)
-        x0 = self.LocalAdapt(x0)
+    def adapt_local(self, patch_feature):
+        x0 = self.LocalAdapt(patch_feature)
         x0 = x0.permute(0, 2, 3, 1)
         local_feature = torch.nn.functional.normalize(x0, p=2, dim=-1)
         return local_feature
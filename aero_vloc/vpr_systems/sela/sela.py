@@ -14,8 +14,8 @@
 import numpy as np
 import torch
 
-from aero_vloc.utils import transform_image_for_vpr
-from aero_vloc.vpr_systems.sela.network import GeoLocalizationNet
+from aero_vloc.utils import VPRPreprocessor
+from aero_vloc.vpr_systems.sela.extractor import SelaExtractor
 from aero_vloc.vpr_systems.vpr_system import VPRSystem
 
 
@@ -37,17 +37,18 @@ class Sela(VPRSystem):
         """
         super().__init__(gpu_index)
         self.resize = (224, 224)
+        self.preprocessor = VPRPreprocessor(self.resize)
 
-        self.model = GeoLocalizationNet(dinov2_path)
-        self.model = self.model.eval().to(self.device)
+        self.extractor = SelaExtractor(path_to_state_dict, dinov2_path, self.device)
+        self.model = self.extractor.model
 
-        state_dict = torch.load(path_to_state_dict)["model_state_dict"]
-        state_dict = {k[7:]: v for k, v in state_dict.items()}
-        self.model.load_state_dict(state_dict)
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        return self.extractor.global_features(batch)
 
-    def get_image_descriptor(self, image: np.ndarray):
-        image = transform_image_for_vpr(image, self.resize)[None, :].to(self.device)
-        with torch.no_grad():
-            descriptor = self.model.global_feat(image)
-        descriptor = descriptor.cpu().numpy()[0]
-        return descriptor
+    def shares_features_with(self, feature_matcher) -> bool:
+        return getattr(feature_matcher, "extractor", None) is self.extractor
+
+    def get_batch_descriptors_and_features(
+        self, batch: torch.Tensor
+    ) -> tuple[np.ndarray, np.ndarray]:
+        return self.extractor.global_local_features(batch)
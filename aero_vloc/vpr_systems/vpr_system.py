@@ -15,9 +15,16 @@ import torch
 import numpy as np
 
 from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from aero_vloc.profiler import PROFILER
+from aero_vloc.utils import VPRPreprocessor
 
 
 class VPRSystem(ABC):
+    # Transformation of the images to the input of the model that does not reference the model
+    preprocessor: Optional[Callable[[np.ndarray], torch.Tensor]] = None
+
     def __init__(self, gpu_index: int = 0):
         """
         :param gpu_index: The index of the GPU to be used
@@ -25,11 +32,188 @@ class VPRSystem(ABC):
         self.device = f"cuda:{gpu_index}" if torch.cuda.is_available() else "cpu"
         print('Running inference on device "{}"'.format(self.device))
 
+    def preprocess_image(self, image: np.ndarray) -> torch.Tensor:
+        """
+        Transforms the image to the input of the model
+        :param image: Image in the OpenCV format
+        :return: Tensor with shape (C, H, W) on CPU
+        """
+        if self.preprocessor is None:
+            raise NotImplementedError(
+                "VPR system should define preprocessor or override preprocess_image"
+            )
+        return self.preprocessor(image)
+
+    def get_preprocessor(self) -> Callable[[np.ndarray], torch.Tensor]:
+        """
+        :return: Picklable function transforming the image to the input of the model.
+                 It is sent to the loader workers, so it should not reference the model.
+                 If the system has no preprocessor, the bound `preprocess_image` is returned,
+                 which pickles the whole system
+        """
+        if self.preprocessor is not None:
+            return self.preprocessor
+        return self.preprocess_image
+
     @abstractmethod
-    def get_image_descriptor(self, image: np.ndarray):
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        """
+        Gets descriptors of the batch of preprocessed images
+        :param batch: Tensor with shape (B, C, H, W) on the device of the model
+        :return: Descriptors with shape (B, D)
+        """
+        pass
+
+    def shares_features_with(self, feature_matcher) -> bool:
+        """
+        :param feature_matcher: Feature matcher used together with the VPR system
+        :return: True if the local features of the feature matcher are calculated
+                 by `get_batch_descriptors_and_features` in the same pass as the descriptors
+        """
+        return False
+
+    def get_batch_descriptors_and_features(
+        self, batch: torch.Tensor
+    ) -> tuple[np.ndarray, Any]:
+        """
+        Gets descriptors and local features of the batch of preprocessed images.
+        It is available only for the feature matchers accepted by `shares_features_with`
+        :param batch: Tensor with shape (B, C, H, W) on the device of the model
+        :return: Descriptors with shape (B, D) and local features of every image
+        """
+        raise NotImplementedError(
+            "VPR system does not calculate the local features of the feature matcher"
+        )
+
+    def get_image_descriptors(
+        self, images: Iterable[np.ndarray], batch_size: int = 32
+    ) -> np.ndarray:
+        """
+        Gets descriptors of several images given.
+        If the system uses `VPRPreprocessor`, the images of the same shape
+        are grouped first and every group is transformed into the batch at once
+
+        :param images: Images in the OpenCV format
+        :param batch_size: Maximum number of images in one batch
+        :return: Descriptors of the images with shape (N, D)
+        """
+        if not isinstance(self.preprocessor, VPRPreprocessor):
+            tensors = (self.preprocess_image(image) for image in images)
+            return self.get_preprocessed_descriptors(tensors, batch_size)
+        positions, descriptors = [], []
+        for batch_positions, batch in bucket_by_shape(images, batch_size):
+            positions.extend(batch_positions)
+            batch = self.preprocessor.transform_batch(batch)
+            descriptors.append(self.__process_batch(batch))
+        return self.__restore_order(positions, descriptors)
+
+    def get_preprocessed_descriptors(
+        self, tensors: Iterable[torch.Tensor], batch_size: int = 32
+    ) -> np.ndarray:
+        """
+        Gets descriptors of several images already transformed with `preprocess_image`.
+        Tensors are grouped into batches by shape, so the images
+        with different aspect ratios do not break the batches of each other
+
+        :param tensors: Preprocessed images with shape (C, H, W)
+        :param batch_size: Maximum number of images in one batch
+        :return: Descriptors of the images with shape (N, D) in the order of the tensors
+        """
+        positions, descriptors = [], []
+        for batch_positions, batch in bucket_by_shape(tensors, batch_size):
+            positions.extend(batch_positions)
+            descriptors.append(self.__process_batch(torch.stack(batch)))
+        return self.__restore_order(positions, descriptors)
+
+    def get_image_descriptors_and_features(
+        self, images: Iterable[np.ndarray], batch_size: int = 32
+    ) -> tuple[np.ndarray, list]:
+        """
+        Gets descriptors and local features of several images given
+        with one pass of the model, see `get_batch_descriptors_and_features`
+
+        :param images: Images in the OpenCV format
+        :param batch_size: Maximum number of images in one batch
+        :return: Descriptors of the images with shape (N, D) and the list of their local features
+        """
+        tensors = (self.preprocess_image(image) for image in images)
+        return self.get_preprocessed_descriptors_and_features(tensors, batch_size)
+
+    def get_preprocessed_descriptors_and_features(
+        self, tensors: Iterable[torch.Tensor], batch_size: int = 32
+    ) -> tuple[np.ndarray, list]:
+        """
+        Gets descriptors and local features of several images
+        already transformed with `preprocess_image`
+
+        :param tensors: Preprocessed images with shape (C, H, W)
+        :param batch_size: Maximum number of images in one batch
+        :return: Descriptors of the images with shape (N, D) and the list of their local features
+                 in the order of the tensors
+        """
+        positions, descriptors, features = [], [], []
+        for batch_positions, batch in bucket_by_shape(tensors, batch_size):
+            positions.extend(batch_positions)
+            with PROFILER.stage("vpr.forward"), torch.no_grad():
+                batch_descriptors, batch_features = (
+                    self.get_batch_descriptors_and_features(
+                        torch.stack(batch).to(self.device)
+                    )
+                )
+            descriptors.append(batch_descriptors)
+            features.extend(batch_features)
+        if len(descriptors) == 0:
+            return np.empty((0, 0), dtype=np.float32), []
+        descriptors = np.concatenate(descriptors)
+        result = np.empty_like(descriptors, dtype=np.float32)
+        result[positions] = descriptors
+        result_features = [None] * len(positions)
+        for position, feature in zip(positions, features):
+            result_features[position] = feature
+        return result, result_features
+
+    def get_image_descriptor(self, image: np.ndarray) -> np.ndarray:
         """
         Gets the descriptor of the image given
         :param image: Image in the OpenCV format
         :return: Descriptor of the image
         """
-        pass
+        return self.get_image_descriptors([image])[0]
+
+    def __process_batch(self, batch: torch.Tensor) -> np.ndarray:
+        with PROFILER.stage("vpr.forward"), torch.no_grad():
+            return self.get_batch_descriptors(batch.to(self.device))
+
+    @staticmethod
+    def __restore_order(
+        positions: list[int], descriptors: list[np.ndarray]
+    ) -> np.ndarray:
+        if len(descriptors) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        descriptors = np.concatenate(descriptors)
+        result = np.empty_like(descriptors, dtype=np.float32)
+        result[positions] = descriptors
+        return result
+
+
+def bucket_by_shape(
+    tensors: Iterable[torch.Tensor | np.ndarray], batch_size: int
+) -> Iterator[tuple[list[int], list[torch.Tensor | np.ndarray]]]:
+    """
+    Groups the tensors or the arrays into batches of the same shape.
+    The batch is yielded as soon as it is full, the incomplete batches
+    are yielded at the end in the order of their first tensors
+
+    :param tensors: Tensors to be grouped
+    :param batch_size: Maximum number of tensors in one batch
+    :return: Positions of the tensors in the input and the tensors of every batch
+    """
+    buckets = {}
+    for position, tensor in enumerate(tensors):
+        positions, batch = buckets.setdefault(tensor.shape, ([], []))
+        positions.append(position)
+        batch.append(tensor)
+        if len(batch) == batch_size:
+            del buckets[tensor.shape]
+            yield positions, batch
+    yield from buckets.values()
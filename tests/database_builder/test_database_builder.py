@@ -0,0 +1,153 @@
+import aero_vloc as avl
+import numpy as np
+import os
+import pytest
+import threading
+import time
+import torch
+
+from pathlib import Path
+
+from aero_vloc.database_builder import calculate_descriptors
+from aero_vloc.feature_matchers import FeatureMatcher
+from tests.utils import MeanColor, create_map
+
+
+class ColorMatcher(FeatureMatcher):
+    """
+    Minimal feature matcher, the keypoints are the brightest pixels of the rows
+    """
+
+    ragged_axes = {"keypoints": 0}
+
+    def __init__(self):
+        super().__init__(resize=800)
+
+    def get_feature(self, image: np.ndarray):
+        gray = image.mean(axis=2)
+        num_keypoints = int(gray.mean()) % 7
+        return {
+            "keypoints": torch.from_numpy(gray.argmax(axis=1)[:num_keypoints]),
+            "image_size": torch.tensor(gray.shape),
+        }
+
+    def match_feature(self, query_features, db_features, k_best):
+        return np.arange(k_best), None, None
+
+
+def create_builder(path_to_build: Path, sat_map, chunk_size: int = 4):
+    return avl.DatabaseBuilder(
+        path_to_build, sat_map, MeanColor(), ColorMatcher(), chunk_size=chunk_size
+    )
+
+
+def test_interrupted_build_is_resumed(tmp_path):
+    """
+    Restarted build should skip the finished chunks
+    and be equal to the build without chunks
+    """
+    sat_map = create_map()
+    builder = create_builder(tmp_path, sat_map)
+    builder.build(chunks=[0, 2])
+    with pytest.raises(ValueError):
+        builder.merge()
+
+    builder = create_builder(tmp_path, sat_map)
+    assert builder.pending_chunks() == [1, 3, 4, 5]
+    builder.build()
+    assert builder.get_stats()["num_tiles"] == len(sat_map) - 8
+    global_descs, local_features = builder.merge()
+
+    expected_descs, expected_features, _ = calculate_descriptors(
+        sat_map, range(len(sat_map)), MeanColor(), ColorMatcher()
+    )
+    assert np.allclose(global_descs, np.stack(expected_descs))
+    assert len(local_features) == len(sat_map)
+    for feature, expected_feature in zip(local_features, expected_features):
+        assert torch.equal(feature["keypoints"], expected_feature["keypoints"])
+        assert torch.equal(feature["image_size"], expected_feature["image_size"])
+
+    with pytest.raises(ValueError):
+        create_builder(tmp_path, sat_map, chunk_size=5)
+
+
+def test_parallel_build(tmp_path):
+    """
+    Build divided between several processes should be equal to the build in one process
+    """
+    sat_map = create_map()
+    builder = create_builder(tmp_path / "parallel", sat_map)
+    stats = builder.build_parallel(num_processes=2, threads_per_process=1)
+    assert stats["num_tiles"] == len(sat_map)
+    assert [worker["chunks"] for worker in stats["workers"]] == [[0, 2, 4], [1, 3, 5]]
+    assert builder.pending_chunks() == []
+
+    serial_builder = create_builder(tmp_path / "serial", sat_map)
+    serial_builder.build()
+    global_descs, local_features = builder.merge()
+    serial_descs, serial_features = serial_builder.merge()
+    assert np.array_equal(global_descs, serial_descs)
+    for feature, serial_feature in zip(local_features, serial_features):
+        assert torch.equal(feature["keypoints"], serial_feature["keypoints"])
+
+
+class KilledMeanColor(MeanColor):
+    """
+    VPR system whose process is killed in the middle of the build
+    """
+
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        os._exit(1)
+
+
+def test_killed_process_fails_build(tmp_path):
+    """
+    Parallel build should fail instead of waiting for the killed process
+    """
+    sat_map = create_map()
+    builder = avl.DatabaseBuilder(
+        tmp_path, sat_map, KilledMeanColor(), ColorMatcher(), chunk_size=4
+    )
+    with pytest.raises(RuntimeError, match="exited with code 1"):
+        builder.build_parallel(num_processes=2, threads_per_process=1)
+
+
+class SlowExitMeanColor(MeanColor):
+    """
+    VPR system whose process keeps running after sending the results
+    """
+
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        if not any(thread.name == "slow_exit" for thread in threading.enumerate()):
+            threading.Thread(target=time.sleep, args=(60,), name="slow_exit").start()
+        return super().get_batch_descriptors(batch)
+
+
+def test_slow_process_is_terminated(tmp_path):
+    """
+    Process which does not exit after sending the results should be terminated
+    without failing the build
+    """
+    sat_map = create_map()
+    builder = avl.DatabaseBuilder(
+        tmp_path, sat_map, SlowExitMeanColor(), ColorMatcher(), chunk_size=4
+    )
+    start = time.perf_counter()
+    stats = builder.build_parallel(
+        num_processes=2, threads_per_process=1, baseline_throughput=1, timeout=1
+    )
+    assert time.perf_counter() - start < 30
+    assert stats["num_tiles"] == len(sat_map)
+    assert stats["speedup"] == stats["throughput"]
+    assert builder.pending_chunks() == []
+
+
+def test_parallel_build_requires_cpu(tmp_path):
+    """
+    Parallel build should refuse the models on GPU, which cannot be used in the forked processes
+    """
+    sat_map = create_map()
+    builder = create_builder(tmp_path, sat_map)
+    builder.vpr_system.device = "cuda:0"
+    with pytest.raises(ValueError, match="on CPU"):
+        builder.build_parallel(num_processes=2)
@@ -0,0 +1,134 @@
+import aero_vloc as avl
+import numpy as np
+import torch
+
+from tests.utils import MeanColor, create_map, path_to_metadata
+
+
+class LinearModel:
+    """
+    Minimal model with weights for the calculation of the keys
+    """
+
+    def __init__(self, seed: int):
+        torch.manual_seed(seed)
+        self.model = torch.nn.Linear(4, 2)
+        self.resize = 800
+
+
+def test_keys_depend_on_content_and_model(tmp_path):
+    """
+    Keys should be equal for the same windows of different maps
+    and differ for different weights
+    """
+    cache = avl.DescriptorCache(tmp_path / "cache")
+    model = LinearModel(seed=0)
+    keys = cache.get_keys(create_map(2, 0), model)
+    overlapping_keys = cache.get_keys(create_map(2, 0.5), model)
+    assert len(set(keys)) == len(keys)
+    # Windows of the first row coincide with every second window of the overlapping map
+    assert set(keys[:4]) < set(overlapping_keys[:7])
+
+    path_to_archive = avl.pack_map(path_to_metadata, tmp_path / "map.avlmap")
+    assert cache.get_keys(create_map(2, 0, path_to_archive), model) == keys
+
+    other_keys = cache.get_keys(create_map(2, 0), LinearModel(seed=1))
+    assert set(keys).isdisjoint(other_keys)
+
+
+class Extractor:
+    """
+    Plain object storing the module, like the extractor of AnyLoc
+    """
+
+    cache_key_attributes = ("layer",)
+
+    def __init__(self, seed: int, layer: int):
+        torch.manual_seed(seed)
+        self.model = torch.nn.Linear(4, 2)
+        self.layer = layer
+
+
+class NestedModel:
+    def __init__(self, seed: int, layer: int, device: str = "cpu"):
+        self.extractor = Extractor(seed, layer)
+        self.device = device
+        self.batch_sizes = []
+        self.resize = 800
+
+
+def test_keys_depend_on_nested_modules_and_config():
+    """
+    Keys should depend on the modules and the configuration stored in the nested objects,
+    but not on the other attributes
+    """
+    key = avl.descriptor_cache.get_model_key(NestedModel(seed=0, layer=31))
+    other_weights = avl.descriptor_cache.get_model_key(NestedModel(seed=1, layer=31))
+    other_layer = avl.descriptor_cache.get_model_key(NestedModel(seed=0, layer=30))
+    assert len({key, other_weights, other_layer}) == 3
+
+    model = NestedModel(seed=0, layer=31, device="cuda:0")
+    model.batch_sizes.append(32)
+    assert avl.descriptor_cache.get_model_key(model) == key
+
+
+def test_shared_module_is_hashed_once(monkeypatch):
+    """
+    Module reachable through several attributes should be hashed once
+    """
+    hashed = []
+    update_tensor_hash = avl.descriptor_cache._update_tensor_hash
+
+    def count_tensor_hash(weights_hash, name, tensor):
+        hashed.append(name)
+        update_tensor_hash(weights_hash, name, tensor)
+
+    monkeypatch.setattr(avl.descriptor_cache, "_update_tensor_hash", count_tensor_hash)
+    model = NestedModel(seed=0, layer=31)
+    model.model = model.extractor.model
+    avl.descriptor_cache.get_weights_hash(model)
+    assert len(hashed) == 2
+
+
+def test_weights_are_hashed_once_per_build(monkeypatch, tmp_path):
+    """
+    Weights of every model should be hashed once for the whole build
+    with several chunks and the descriptor cache
+    """
+    hashed = []
+    get_weights_hash = avl.descriptor_cache.get_weights_hash
+
+    def count_weights_hash(model):
+        hashed.append(type(model))
+        return get_weights_hash(model)
+
+    monkeypatch.setattr(avl.descriptor_cache, "get_weights_hash", count_weights_hash)
+    builder = avl.DatabaseBuilder(
+        tmp_path / "build",
+        create_map(2, 0),
+        MeanColor(),
+        None,
+        chunk_size=2,
+        descriptor_cache=avl.DescriptorCache(tmp_path / "cache"),
+    )
+    builder.build()
+    assert len(builder.finished_chunks()) > 1
+    assert hashed == [MeanColor]
+
+
+def test_cache_round_trip(tmp_path):
+    """
+    Cached values should be equal to the saved ones, missing values should be None
+    """
+    cache = avl.DescriptorCache(tmp_path)
+    descriptor = np.random.rand(16).astype(np.float32)
+    features = {"keypoints": torch.rand(1, 5, 2), "shape": torch.Size([4, 4])}
+    cache.put("a" * 64, descriptor)
+    cache.put("b" * 64, features)
+
+    assert np.array_equal(cache.get("a" * 64), descriptor)
+    loaded_features = cache.get("b" * 64)
+    assert torch.equal(loaded_features["keypoints"], features["keypoints"])
+    assert loaded_features["shape"] == features["shape"]
+    assert cache.get("c" * 64) is None
+    assert (cache.hits, cache.misses) == (2, 1)
@@ -17,3 +17,38 @@ def test_faiss_searcher_k_closest():
             result = faiss_searcher.search(query_desc, k_closest=k_closest)
 
             assert len(result) == k_closest
+
+
+def test_faiss_searcher_add_in_chunks():
+    """
+    Index filled in chunks should be equal to the index created at once
+    """
+    descs = np.random.rand(1000, 64).astype(np.float32)
+    faiss_searcher = avl.FaissSearcher()
+    faiss_searcher.create(descs)
+    chunked_searcher = avl.FaissSearcher()
+    for start in range(0, len(descs), 128):
+        chunked_searcher.add(descs[start : start + 128])
+
+    assert chunked_searcher.faiss_index.ntotal == len(descs)
+    query_desc = np.random.rand(1, 64).astype(np.float32)
+    assert np.array_equal(
+        chunked_searcher.search(query_desc, 10), faiss_searcher.search(query_desc, 10)
+    )
+
+
+def test_faiss_searcher_candidates():
+    """
+    Search among the candidates should return the nearest candidates
+    and not more than the number of the candidates
+    """
+    descs = np.random.rand(200, 16).astype(np.float32)
+    faiss_searcher = avl.FaissSearcher()
+    faiss_searcher.create(descs)
+    query_desc = np.random.rand(1, 16).astype(np.float32)
+    candidates = np.arange(0, 200, 7)
+
+    distances = ((descs[candidates] - query_desc) ** 2).sum(axis=1)
+    expected = candidates[np.argsort(distances)[:5]]
+    assert np.array_equal(faiss_searcher.search(query_desc, 5, candidates), expected)
+    assert len(faiss_searcher.search(query_desc, 50, candidates[:3])) == 3
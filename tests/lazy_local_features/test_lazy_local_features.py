@@ -0,0 +1,47 @@
+import aero_vloc as avl
+import numpy as np
+
+from aero_vloc.feature_matchers import FeatureMatcher
+from tests.utils import create_map
+
+
+class MeanColorMatcher(FeatureMatcher):
+    """
+    Minimal feature matcher counting the extracted features
+    """
+
+    def __init__(self):
+        super().__init__(resize=800)
+        self.num_extracted = 0
+
+    def get_feature(self, image: np.ndarray):
+        self.num_extracted += 1
+        return image.mean(axis=(0, 1))
+
+    def match_feature(self, query_features, db_features, k_best):
+        distances = np.linalg.norm(db_features - query_features, axis=1)
+        return distances.argsort()[:k_best], None, None
+
+
+def test_features_are_extracted_on_demand(tmp_path):
+    """
+    Features should be extracted once per tile while the tile is in the cache
+    and reused from the descriptor cache by another instance
+    """
+    sat_map = create_map()
+    matcher = MeanColorMatcher()
+    descriptor_cache = avl.DescriptorCache(tmp_path)
+    features = avl.LazyLocalFeatures(
+        sat_map, matcher, cache_size=4, descriptor_cache=descriptor_cache
+    )
+    features.warm_up([0, 1])
+    candidates = features[np.array([1, 5, 0])]
+    assert matcher.num_extracted == 3
+    for index, feature in zip([1, 5, 0], candidates):
+        assert np.array_equal(feature, sat_map[index].image.mean(axis=(0, 1)))
+
+    other_features = avl.LazyLocalFeatures(
+        sat_map, matcher, cache_size=4, descriptor_cache=descriptor_cache
+    )
+    assert np.array_equal(other_features[np.array([0, 5])], candidates[[2, 1]])
+    assert matcher.num_extracted == 3
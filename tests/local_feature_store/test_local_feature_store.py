@@ -0,0 +1,76 @@
+import aero_vloc as avl
+import numpy as np
+import pytest
+import pickle
+import torch
+
+
+def create_superglue_features(num_keypoints: int) -> dict:
+    return {
+        "keypoints": torch.rand(1, num_keypoints, 2),
+        "scores": torch.rand(1, num_keypoints),
+        "descriptors": torch.rand(1, 256, num_keypoints),
+        "shape": torch.Size([600, 800]),
+    }
+
+
+def test_ragged_features_round_trip(tmp_path):
+    """
+    Features with the different number of keypoints should be read
+    from the store equal to the saved ones
+    """
+    features = [create_superglue_features(n) for n in [5, 0, 17, 3]]
+    store = avl.LocalFeatureStore.save(tmp_path, features, avl.SuperGlue.ragged_axes)
+    store = pickle.loads(pickle.dumps(avl.LocalFeatureStore(tmp_path)))
+
+    assert len(store) == len(features)
+    candidates = np.array([2, 0, 1])
+    for feature, stored_feature in zip(
+        [features[i] for i in candidates], store[candidates]
+    ):
+        assert stored_feature.keys() == feature.keys()
+        assert stored_feature["shape"] == feature["shape"]
+        for key in ["keypoints", "scores", "descriptors"]:
+            assert torch.equal(stored_feature[key], feature[key])
+    assert torch.equal(store[-1]["descriptors"], features[-1]["descriptors"])
+
+
+def test_dense_features_round_trip(tmp_path):
+    """
+    Dense features should be stacked as the NumPy array of features
+    """
+    features = np.random.rand(4, 6, 6, 8).astype(np.float32)
+    store = avl.LocalFeatureStore.save(tmp_path, features, {})
+    assert np.array_equal(store[np.array([3, 1])], features[[3, 1]])
+    assert np.array_equal(store[2], features[2])
+
+
+@pytest.mark.parametrize("compression, tolerance", [("float16", 1e-3), ("int8", 5e-3)])
+def test_compressed_descriptors(tmp_path, compression, tolerance):
+    """
+    Compressed descriptors should be close to the original ones
+    and take less space, other values should be stored as is
+    """
+    features = [create_superglue_features(n) for n in [50, 0, 170]]
+    for feature in features:
+        feature["descriptors"] = torch.nn.functional.normalize(
+            feature["descriptors"], dim=1
+        )
+    store = avl.LocalFeatureStore.save(
+        tmp_path / compression, features, avl.SuperGlue.ragged_axes, compression
+    )
+    plain_store = avl.LocalFeatureStore.save(
+        tmp_path / "plain", features, avl.SuperGlue.ragged_axes
+    )
+
+    for feature, stored_feature in zip(features, store):
+        assert stored_feature["descriptors"].dtype == torch.float32
+        assert torch.allclose(
+            stored_feature["descriptors"], feature["descriptors"], atol=tolerance
+        )
+        assert torch.equal(stored_feature["keypoints"], feature["keypoints"])
+    compressed_size = sum(path.stat().st_size for path in store.path_to_store.iterdir())
+    plain_size = sum(
+        path.stat().st_size for path in plain_store.path_to_store.iterdir()
+    )
+    assert compressed_size < plain_size
@@ -0,0 +1,216 @@
+import aero_vloc as avl
+import cv2
+import numpy as np
+import pickle
+import os
+import pytest
+import shutil
+
+from aero_vloc.maps.base_map import BaseMap
+from tests.utils import create_map, path_to_metadata
+
+
+def test_tile_cache_decodes_each_file_once():
+    """
+    Iterating over an overlapping map should decode every image file only once
+    """
+    sat_map = create_map(zoom=1, overlap_level=0.5)
+    sat_map.tile_cache.clear()
+    images = [tile.image for tile in sat_map]
+
+    assert len(images) == 3
+    assert sat_map.tile_cache.misses == 2
+    assert sat_map.tile_cache.hits == 2
+
+
+def test_tile_cache_does_not_change_images():
+    """
+    Cached tiles should be equal to the tiles decoded without the cache
+    """
+    sat_map = avl.Map(
+        path_to_metadata,
+        zoom=1.5,
+        overlap_level=0.25,
+        geo_referencer=avl.LinearReferencer(),
+        cache_size=1,
+    )
+    for tile in sat_map:
+        cached_image = tile.image
+        tile.tile_cache = None
+        assert np.array_equal(cached_image, tile.image)
+
+
+def test_tile_shape_without_decoding():
+    """
+    Shapes of the tiles should be obtained without decoding of the images
+    and be equal to the shapes of the images
+    """
+    for zoom in [1, 1.5, 2]:
+        sat_map = create_map(zoom=zoom, overlap_level=0.5)
+        assert sat_map.tile_cache.misses == 0
+        for tile in sat_map:
+            assert tile.shape == tile.image.shape[:2]
+
+
+def test_mosaic_map(tmp_path):
+    """
+    Tiles of the map converted to the mosaic should be views
+    equal to the tiles read from the image files
+    """
+    path_to_mosaic_metadata = avl.create_mosaic(path_to_metadata, tmp_path)
+    for zoom, overlap_level in [(1, 0), (1.5, 0.25), (2, 0.5)]:
+        sat_map = create_map(zoom=zoom, overlap_level=overlap_level)
+        mosaic_map = avl.Map(
+            path_to_mosaic_metadata,
+            zoom=zoom,
+            overlap_level=overlap_level,
+            geo_referencer=avl.LinearReferencer(),
+        )
+        assert len(mosaic_map) == len(sat_map)
+        for tile, mosaic_tile in zip(sat_map, mosaic_map):
+            mosaic_image = mosaic_tile.image
+            assert np.shares_memory(mosaic_image, mosaic_map.mosaic.image)
+            assert np.array_equal(tile.image, mosaic_image)
+            assert mosaic_tile.top_left_lat == tile.top_left_lat
+            assert mosaic_tile.bottom_right_lon == tile.bottom_right_lon
+
+
+def test_stale_mosaic_is_refused(tmp_path):
+    """
+    Mosaic should be refused if its image files changed after it was created,
+    if its shape does not fit the map or if it has no record of the image files
+    """
+    map_folder = tmp_path / "map"
+    shutil.copytree(path_to_metadata.parent, map_folder)
+    path_to_map_metadata = map_folder / path_to_metadata.name
+    avl.create_mosaic(path_to_map_metadata, map_folder)
+    assert BaseMap(path_to_map_metadata).mosaic is not None
+
+    stat = (map_folder / "0.png").stat()
+    os.utime(map_folder / "0.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    with pytest.raises(ValueError, match="changed after the mosaic"):
+        BaseMap(path_to_map_metadata)
+    assert BaseMap(path_to_map_metadata, use_mosaic=False).mosaic is None
+
+    avl.create_mosaic(path_to_map_metadata, map_folder)
+    mosaic = np.load(map_folder / "mosaic.npy")
+    np.save(map_folder / "mosaic.npy", mosaic[:, :-1])
+    with pytest.raises(ValueError, match="does not fit"):
+        BaseMap(path_to_map_metadata)
+    np.save(map_folder / "mosaic.npy", mosaic[:-1])
+    with pytest.raises(ValueError, match="Shape of the mosaic"):
+        BaseMap(path_to_map_metadata)
+
+    avl.create_mosaic(path_to_map_metadata, map_folder)
+    (map_folder / "mosaic_sources.json").unlink()
+    with pytest.raises(ValueError, match="no record"):
+        BaseMap(path_to_map_metadata)
+
+
+def test_lazy_tiles():
+    """
+    Tiles of the map should be generated on demand and
+    coincide with the base tiles if zoom and overlap are not changed
+    """
+    base_map = BaseMap(path_to_metadata)
+    sat_map = create_map(zoom=1, overlap_level=0)
+    assert len(sat_map) == len(base_map)
+    assert sat_map.shape == base_map.shape
+    for base_tile, tile in zip(base_map, sat_map):
+        assert tile.paths == base_tile.paths
+        assert np.isclose(tile.top_left_lat, base_tile.top_left_lat)
+        assert np.isclose(tile.top_left_lon, base_tile.top_left_lon)
+        assert np.isclose(tile.bottom_right_lat, base_tile.bottom_right_lat)
+        assert np.isclose(tile.bottom_right_lon, base_tile.bottom_right_lon)
+
+    sat_map = avl.Map(
+        path_to_metadata,
+        zoom=4,
+        overlap_level=0.75,
+        geo_referencer=avl.GoogleMapsReferencer(zoom=17),
+    )
+    assert len(sat_map) == 13 * 29
+    assert (
+        sat_map[-1].region_of_interest == sat_map[len(sat_map) - 1].region_of_interest
+    )
+    with pytest.raises(IndexError):
+        sat_map[len(sat_map)]
+
+    indices = np.array([3, 0, -1])
+    for tiles in [sat_map[indices], sat_map[list(indices)]]:
+        assert [tile.region_of_interest for tile in tiles] == [
+            sat_map[i].region_of_interest for i in indices
+        ]
+    with pytest.raises(TypeError):
+        sat_map[1.5]
+
+    tiles = sat_map.tiles
+    assert len(tiles) == len(sat_map)
+    assert tiles[5].paths == sat_map[5].paths
+
+
+def test_neighbors():
+    """
+    Vectorized neighbor queries should agree with the neighbors of single tiles
+    """
+    sat_map = create_map(zoom=3, overlap_level=0.5)
+    height, width = sat_map.shape
+    indices = np.arange(len(sat_map))
+    neighbors = sat_map.neighbors_of(indices)
+    are_neighbors = sat_map.are_neighbors(indices[:, None], indices[None, :])
+    for index in indices:
+        expected = sat_map.get_neighboring_tiles(index)
+        assert sorted(neighbors[index][neighbors[index] >= 0]) == sorted(expected)
+        assert sorted(np.flatnonzero(are_neighbors[index])) == sorted(expected)
+    assert sat_map.get_neighboring_tiles(0) == [1, width, width + 1]
+    assert not sat_map.are_neighbors(0, 0)
+
+
+def test_map_archive(tmp_path):
+    """
+    Tiles of the map packed into the archive should be equal
+    to the tiles read from the image files
+    """
+    path_to_archive = avl.pack_map(path_to_metadata, tmp_path / "map.avlmap")
+    for zoom, overlap_level in [(1, 0), (1.5, 0.25), (2, 0.5)]:
+        sat_map = create_map(zoom=zoom, overlap_level=overlap_level)
+        archive_map = avl.Map(
+            path_to_archive,
+            zoom=zoom,
+            overlap_level=overlap_level,
+            geo_referencer=avl.LinearReferencer(),
+        )
+        assert archive_map.shape == sat_map.shape
+        assert np.allclose(archive_map.corners, sat_map.corners)
+        for tile, archive_tile in zip(sat_map, archive_map):
+            assert archive_tile.shape == tile.shape
+            assert np.array_equal(archive_tile.image, tile.image)
+
+    archive = pickle.loads(pickle.dumps(archive_map.archive))
+    path = archive_map.source_paths[0]
+    assert archive.read(path).shape[:2] == archive.read_shape(path)
+    with open(path_to_metadata.parents[0] / path.name, "rb") as file:
+        assert archive.read_blob(path) == file.read()
+
+
+def test_tile_image_equals_cropped_stitched_image():
+    """
+    Tiles assembled from the parts of the image files should be equal
+    to the crops of the stitched image files
+    """
+    for zoom, overlap_level in [(1, 0.5), (1.5, 0.25), (2, 0.75), (3, 0)]:
+        sat_map = create_map(zoom=zoom, overlap_level=overlap_level)
+        for tile in sat_map:
+            stitched_image = np.vstack(
+                [
+                    np.hstack([cv2.imread(str(path)) for path in line])
+                    for line in tile.paths
+                ]
+            )
+            top_left_x, top_left_y, bottom_right_x, bottom_right_y = (
+                tile.region_of_interest
+            )
+            expected_image = stitched_image[
+                top_left_y : bottom_right_y + 1, top_left_x : bottom_right_x + 1
+            ]
+            assert np.array_equal(tile.image, expected_image)
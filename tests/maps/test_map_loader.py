@@ -0,0 +1,33 @@
+import aero_vloc as avl
+import numpy as np
+import pytest
+
+from aero_vloc.maps import MapLoader
+from aero_vloc.utils import transform_image_for_vpr
+from tests.utils import create_map
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_map_loader_keeps_order(num_workers):
+    """
+    Loader should yield the preprocessed tiles in the order of the map
+    and count the processed tiles
+    """
+    sat_map = create_map()
+    loader = MapLoader(
+        sat_map,
+        lambda image: transform_image_for_vpr(image, 64),
+        batch_size=4,
+        num_workers=num_workers,
+    )
+    tensors, images = [], []
+    for batch_tensors, batch_images in loader:
+        assert len(batch_tensors) == len(batch_images) <= 4
+        tensors.extend(batch_tensors)
+        images.extend(batch_images)
+
+    assert loader.num_tiles == len(sat_map)
+    assert 0 <= loader.overlap <= 1
+    for tile, tensor, image in zip(sat_map, tensors, images):
+        assert np.array_equal(tile.image, image)
+        assert np.allclose(transform_image_for_vpr(tile.image, 64), tensor)
@@ -0,0 +1,40 @@
+import aero_vloc as avl
+import numpy as np
+
+from tests.utils import path_to_metadata
+
+
+def test_map_pyramid_children():
+    """
+    Every tile of the finer level should belong to some tile of the coarser level,
+    and the center of a child tile should lie inside its parent
+    if the parent covers it
+    """
+    pyramid = avl.MapPyramid(
+        path_to_metadata,
+        zooms=[4, 1, 2],
+        overlap_level=0.5,
+        geo_referencer=avl.LinearReferencer(),
+    )
+    assert pyramid.zooms == [1, 2, 4]
+    assert [len(level) for level in pyramid.levels] == [3, 21, 105]
+    assert pyramid.levels[-1] is pyramid
+
+    for level in range(len(pyramid.levels) - 1):
+        coarse_level = pyramid.levels[level]
+        fine_level = pyramid.levels[level + 1]
+        all_children = pyramid.children_of(level, np.arange(len(coarse_level)))
+        assert np.array_equal(all_children, np.arange(len(fine_level)))
+
+        for index in range(len(coarse_level)):
+            children = pyramid.children_of(level, [index])
+            assert 0 < len(children) < len(fine_level)
+            for child in children:
+                assert index in pyramid.parents_of(level + 1, [child])
+                child_tile = fine_level[child]
+                center_lat = (child_tile.top_left_lat + child_tile.bottom_right_lat) / 2
+                center_lon = (child_tile.top_left_lon + child_tile.bottom_right_lon) / 2
+                containing = coarse_level.spatial_index.query_points(
+                    [center_lat], [center_lon]
+                )[0]
+                assert len(containing) == 0 or index in containing
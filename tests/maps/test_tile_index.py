@@ -0,0 +1,54 @@
+import aero_vloc as avl
+import numpy as np
+
+from pathlib import Path
+
+from tests.utils import create_map
+
+queries = avl.UAVSeq(Path("tests/test_data/queries/queries.txt"))
+
+
+def test_query_points():
+    """
+    Tiles found with the spatial index should be the same as with the brute force search.
+    The second query was taken outside the test map
+    """
+    sat_map = create_map(zoom=3, overlap_level=0.5)
+    lats = [uav_image.gt_latitude for uav_image in queries]
+    lons = [uav_image.gt_longitude for uav_image in queries]
+    gt_tiles = sat_map.spatial_index.query_points(lats, lons)
+
+    expected = [
+        i
+        for i, tile in enumerate(sat_map)
+        if tile.top_left_lat > lats[0] > tile.bottom_right_lat
+        and tile.top_left_lon < lons[0] < tile.bottom_right_lon
+    ]
+    assert len(expected) > 0
+    assert gt_tiles[0].tolist() == expected
+    assert len(gt_tiles[1]) == 0
+
+
+def test_query_bbox_and_radius():
+    """
+    Bounding box and radius queries should find the tiles near the point
+    """
+    rng = np.random.default_rng(0)
+    top_left = rng.uniform(0, 1, (10000, 2))
+    corners = np.hstack([top_left, top_left + rng.uniform(0.01, 0.05, (10000, 2))])
+    corners[:, [0, 2]] = -corners[:, [0, 2]]
+    tile_index = avl.maps.TileIndex(corners)
+
+    bbox = tile_index.query_bbox(-0.4, 0.4, -0.5, 0.5)
+    expected = np.flatnonzero(
+        (corners[:, 2] <= -0.4)
+        & (-0.5 <= corners[:, 0])
+        & (corners[:, 1] <= 0.5)
+        & (0.4 <= corners[:, 3])
+    )
+    assert np.array_equal(bbox, expected)
+
+    inside = tile_index.query_points([-0.45], [0.45])[0]
+    near = tile_index.query_radius(-0.45, 0.45, radius=1000)
+    assert len(inside) > 0
+    assert set(inside) <= set(near) <= set(bbox)
@@ -0,0 +1,60 @@
+import aero_vloc as avl
+import json
+
+from tests.utils import create_map
+
+
+def test_stages_are_recorded(tmp_path):
+    """
+    Enabled profiler should count the calls of every stage
+    and export the summary and the Chrome trace
+    """
+    profiler = avl.Profiler(enabled=True)
+    for _ in range(10):
+        with profiler.stage("outer"):
+            with profiler.stage("inner"):
+                pass
+    summary = profiler.summary()
+    assert summary["outer"]["count"] == 10
+    assert summary["inner"]["count"] == 10
+    assert summary["outer"]["total"] >= summary["inner"]["total"]
+    assert summary["outer"]["p50"] <= summary["outer"]["p99"]
+
+    profiler.save_json(tmp_path / "summary.json")
+    with open(tmp_path / "summary.json") as file:
+        assert json.load(file) == summary
+
+    profiler.save_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as file:
+        events = json.load(file)["traceEvents"]
+    assert len(events) == 20
+    assert all(event["ph"] == "X" for event in events)
+
+
+def test_disabled_profiler_records_nothing():
+    """
+    Disabled profiler should return the shared empty context and record nothing
+    """
+    profiler = avl.Profiler()
+    assert profiler.stage("first") is profiler.stage("second")
+    with profiler.stage("first"):
+        pass
+    assert profiler.summary() == {}
+
+
+def test_map_loading_is_profiled():
+    """
+    Shared profiler should record decoding of the tiles loaded in the main process
+    """
+    sat_map = create_map()
+    avl.PROFILER.reset()
+    avl.PROFILER.enable()
+    try:
+        for _ in avl.maps.MapLoader(sat_map, batch_size=4):
+            pass
+    finally:
+        avl.PROFILER.disable()
+    summary = avl.PROFILER.summary()
+    avl.PROFILER.reset()
+    assert summary["map.decode"]["count"] == len(sat_map)
+    assert "map.wait" in summary
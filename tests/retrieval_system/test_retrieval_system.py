@@ -0,0 +1,97 @@
+import aero_vloc as avl
+import numpy as np
+import pytest
+
+from aero_vloc.feature_matchers import FeatureMatcher
+from aero_vloc.primitives import UAVImage
+from tests.utils import MeanColor, create_map, path_to_metadata
+
+
+class NoMatcher(FeatureMatcher):
+    """
+    Feature matcher for the retrieval without re-ranking
+    """
+
+    def __init__(self):
+        super().__init__(resize=800)
+
+    def get_feature(self, image: np.ndarray):
+        return None
+
+    def match_feature(self, query_features, db_features, k_best):
+        return np.arange(k_best), None, None
+
+
+class Query(UAVImage):
+    def __init__(self, image: np.ndarray):
+        self._image = image
+
+    @property
+    def image(self) -> np.ndarray:
+        return self._image
+
+
+def create_retrieval_system(sat_map, coarse_to_fine: bool) -> avl.RetrievalSystem:
+    return avl.RetrievalSystem(
+        MeanColor(),
+        sat_map,
+        NoMatcher(),
+        avl.FaissSearcher(),
+        lazy_local_features=True,
+        coarse_to_fine=coarse_to_fine,
+    )
+
+
+def test_coarse_to_fine_retrieval():
+    """
+    Coarse-to-fine retrieval should be equal to the exhaustive search
+    if all the coarse tiles are chosen, otherwise it should find
+    the nearest tiles among the children of the chosen coarse tiles
+    """
+    pyramid = avl.MapPyramid(
+        path_to_metadata,
+        zooms=[1, 2, 4],
+        overlap_level=0.5,
+        geo_referencer=avl.LinearReferencer(),
+    )
+    retrieval_system = create_retrieval_system(pyramid, coarse_to_fine=True)
+    assert [len(descs) for descs in retrieval_system.coarse_descs] == [3, 21]
+    vpr_system = retrieval_system.vpr_system
+    fine_descs = vpr_system.get_image_descriptors(tile.image for tile in pyramid)
+
+    for query_index in [0, 50, 104]:
+        query = Query(pyramid[query_index].image)
+        exhaustive, _, _ = retrieval_system(query, 5, None)
+        predictions, _, _ = retrieval_system(query, 5, None, coarse_k_closest=21)
+        assert np.array_equal(predictions, exhaustive)
+
+        predictions, _, _ = retrieval_system(query, 5, None, coarse_k_closest=1)
+        query_desc = vpr_system.get_image_descriptor(query.image)
+        candidates = np.arange(3)
+        for level, level_descs in enumerate(retrieval_system.coarse_descs):
+            distances = ((level_descs[candidates] - query_desc) ** 2).sum(axis=1)
+            best_candidate = candidates[np.argsort(distances, kind="stable")[:1]]
+            candidates = pyramid.children_of(level, best_candidate)
+        distances = ((fine_descs[candidates] - query_desc) ** 2).sum(axis=1)
+        expected = candidates[np.argsort(distances, kind="stable")[:5]]
+        assert np.array_equal(predictions, expected)
+
+
+def test_coarse_to_fine_retrieval_requires_coarse_descriptors():
+    """
+    Coarse descriptors should be calculated only on request
+    """
+    pyramid = avl.MapPyramid(
+        path_to_metadata,
+        zooms=[1, 4],
+        overlap_level=0.5,
+        geo_referencer=avl.LinearReferencer(),
+    )
+    retrieval_system = create_retrieval_system(pyramid, coarse_to_fine=False)
+    assert retrieval_system.coarse_descs == []
+    with pytest.raises(ValueError):
+        retrieval_system(Query(pyramid[0].image), 5, None, coarse_k_closest=1)
+
+    sat_map = create_map(zoom=1, overlap_level=0.5)
+    with pytest.raises(ValueError):
+        create_retrieval_system(sat_map, coarse_to_fine=True)
@@ -1,13 +1,66 @@
 import aero_vloc as avl
+import numpy as np
+import torch
 
+from functools import cache
 from pathlib import Path
 
-salad = avl.SALAD()
-light_glue = avl.LightGlue()
+from aero_vloc.utils import transform_image_for_vpr
+from aero_vloc.geo_referencers import GeoReferencer
+from aero_vloc.vpr_systems import VPRSystem
+
+path_to_metadata = Path("tests/test_data/map/map_metadata.txt")
 homography_estimator = avl.HomographyEstimator()
 queries = avl.UAVSeq(Path("tests/test_data/queries/queries.txt"))
 
 
+# Pretrained models are loaded only by the tests that use them
+@cache
+def get_salad() -> avl.SALAD:
+    return avl.SALAD()
+
+
+@cache
+def get_light_glue() -> avl.LightGlue:
+    return avl.LightGlue()
+
+
+def create_map(
+    zoom: float = 2,
+    overlap_level: float = 0.5,
+    path: Path = path_to_metadata,
+    geo_referencer: GeoReferencer = None,
+) -> avl.Map:
+    """
+    Creates the test satellite map, by default with the linear georeferencing
+    """
+    return avl.Map(
+        path,
+        zoom=zoom,
+        overlap_level=overlap_level,
+        geo_referencer=(
+            avl.LinearReferencer() if geo_referencer is None else geo_referencer
+        ),
+    )
+
+
+class MeanColor(VPRSystem):
+    """
+    Minimal VPR system, the descriptor is the mean color of the image
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def preprocess_image(self, image: np.ndarray) -> torch.Tensor:
+        return transform_image_for_vpr(image, 32)
+
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        self.batch_sizes.append(len(batch))
+        return batch.mean(dim=(2, 3)).cpu().numpy()
+
+
 def create_localization_pipeline(
     zoom=1, overlap_level=0, geo_referencer=avl.LinearReferencer()
 ):
@@ -15,14 +68,11 @@ def create_localization_pipeline(
     Creates localization pipeline based on SALAD place recognition system,
     LightGlue keypoint matcher and test satellite map
     """
-    sat_map = avl.Map(
-        Path("tests/test_data/map/map_metadata.txt"),
-        zoom=zoom,
-        overlap_level=overlap_level,
-        geo_referencer=geo_referencer,
-    )
+    sat_map = create_map(zoom, overlap_level, geo_referencer=geo_referencer)
     faiss_searcher = avl.FaissSearcher()
-    retrieval_system = avl.RetrievalSystem(salad, sat_map, light_glue, faiss_searcher)
+    retrieval_system = avl.RetrievalSystem(
+        get_salad(), sat_map, get_light_glue(), faiss_searcher
+    )
     localization_pipeline = avl.LocalizationPipeline(
         retrieval_system, homography_estimator
     )
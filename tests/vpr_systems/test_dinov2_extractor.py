@@ -0,0 +1,60 @@
+import pytest
+import torch
+
+from concurrent.futures import ThreadPoolExecutor
+from torch.nn import functional as F
+
+from aero_vloc.vpr_systems.anyloc.models import DinoV2ExtractFeatures
+from aero_vloc.vpr_systems.sela.backbone.vision_transformer import (
+    DinoVisionTransformer,
+)
+
+
+def create_extractor(monkeypatch, facet: str, block_chunks: int):
+    torch.manual_seed(0)
+    model = DinoVisionTransformer(
+        img_size=56,
+        patch_size=14,
+        embed_dim=32,
+        depth=4,
+        num_heads=2,
+        block_chunks=block_chunks,
+    )
+    monkeypatch.setattr(torch.hub, "load", lambda *args: model)
+    return DinoV2ExtractFeatures("dinov2_vits14", layer=2, facet=facet)
+
+
+@pytest.mark.parametrize("block_chunks", [0, 2])
+@pytest.mark.parametrize("facet", ["value", "token"])
+def test_truncated_forward_equals_full_forward(monkeypatch, facet, block_chunks):
+    """
+    Features of the truncated forward pass should be equal
+    to the features captured from the full forward pass
+    """
+    extractor = create_extractor(monkeypatch, facet, block_chunks)
+    block = extractor.blocks[2]
+    module = block if facet == "token" else block.attn.qkv
+    outputs = []
+    handle = module.register_forward_hook(lambda m, i, output: outputs.append(output))
+    images = torch.rand(2, 3, 56, 56)
+    with torch.no_grad():
+        extractor.dino_model(images)
+    handle.remove()
+
+    expected = outputs[0][:, 1:]
+    if facet == "value":
+        expected = expected[:, :, 64:]
+    assert torch.allclose(extractor(images), F.normalize(expected, dim=-1), atol=1e-6)
+
+
+def test_extractor_is_reentrant(monkeypatch):
+    """
+    Concurrent calls of one extractor should return the features of their own images
+    """
+    extractor = create_extractor(monkeypatch, "value", 0)
+    images = [torch.rand(1, 3, 56, 56) for _ in range(16)]
+    expected = [extractor(image) for image in images]
+    with ThreadPoolExecutor(4) as executor:
+        features = list(executor.map(extractor, images))
+    for feature, expected_feature in zip(features, expected):
+        assert torch.allclose(feature, expected_feature)
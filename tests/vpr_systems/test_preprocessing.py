@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+import torchvision
+
+from PIL import Image
+from torchvision.transforms import InterpolationMode
+
+from aero_vloc.utils import (
+    VPRPreprocessor,
+    transform_image_for_vpr,
+    transform_images_for_vpr,
+)
+
+
+def transform_with_pil(image: np.ndarray, size: tuple, interpolation):
+    transform = torchvision.transforms.Compose(
+        [
+            torchvision.transforms.Resize(size, interpolation=interpolation),
+            torchvision.transforms.ToTensor(),
+            torchvision.transforms.Normalize(
+                mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
+            ),
+        ]
+    )
+    return transform(Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+
+@pytest.mark.parametrize(
+    "resize, size, interpolation",
+    [
+        (64, (48, 64), InterpolationMode.BILINEAR),
+        (64, (48, 64), InterpolationMode.BICUBIC),
+        (64, (48, 64), InterpolationMode.NEAREST),
+        (64, (48, 64), InterpolationMode.LANCZOS),
+        ((32, 32), (32, 32), InterpolationMode.BILINEAR),
+        (256, (120, 160), InterpolationMode.BILINEAR),
+    ],
+)
+def test_transform_equals_pil_transform(resize, size, interpolation):
+    """
+    Fused transform should be equal to the composition of PIL-based transforms
+    """
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    transformed = transform_image_for_vpr(image, resize, interpolation)
+    expected = transform_with_pil(image, size, interpolation)
+    assert transformed.shape == expected.shape
+    assert torch.allclose(transformed, expected, atol=1e-5)
+
+
+def test_batch_transform_equals_single_transforms():
+    """
+    Transformed batch should consist of the transformed images
+    """
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (120, 160, 3), dtype=np.uint8) for _ in range(3)]
+    batch = transform_images_for_vpr(images, 64)
+    assert batch.shape == (3, 3, 48, 64)
+    for image, transformed in zip(images, batch):
+        assert torch.equal(transform_image_for_vpr(image, 64), transformed)
+
+    with pytest.raises(ValueError):
+        transform_images_for_vpr([images[0], images[0][:100]], 64)
+
+
+def test_preprocessor_batch_equals_single_images():
+    """
+    Batch of the preprocessor should consist of the preprocessed and cropped images
+    """
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (120, 160, 3), dtype=np.uint8) for _ in range(3)]
+    preprocessor = VPRPreprocessor(64, patch_size=14)
+    batch = preprocessor.transform_batch(images)
+    assert batch.shape == (3, 3, 42, 56)
+    for image, transformed in zip(images, batch):
+        assert torch.equal(preprocessor(image), transformed)
@@ -0,0 +1,81 @@
+import aero_vloc as avl
+import numpy as np
+import pytest
+import torch
+
+from torch import nn
+
+from aero_vloc.database_builder import calculate_descriptors
+from aero_vloc.vpr_systems.sela import network
+from tests.utils import create_map
+
+
+class CountingBackbone(nn.Module):
+    """
+    Small stand-in for DINOv2 counting its forward passes
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.proj = nn.Conv2d(3, 1024, kernel_size=14, stride=14)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += 1
+        return {"x_norm_patchtokens": self.proj(x).flatten(2).transpose(1, 2)}
+
+
+@pytest.fixture
+def sela(monkeypatch, tmp_path):
+    torch.manual_seed(0)
+    monkeypatch.setattr(network, "get_backbone", lambda path: CountingBackbone())
+    state_dict = network.GeoLocalizationNet(None).state_dict()
+    path_to_state_dict = tmp_path / "sela.pth"
+    torch.save(
+        {"model_state_dict": {f"module.{k}": v for k, v in state_dict.items()}},
+        path_to_state_dict,
+    )
+    return avl.Sela(path_to_state_dict, None)
+
+
+def test_shared_pass_equals_separate_passes(sela):
+    """
+    Global descriptors and local features of one backbone pass should be equal
+    to the outputs of the separate passes of the VPR system and the re-ranker
+    """
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(3)]
+    sela_local = avl.SelaLocal(sela=sela)
+    backbone = sela.model.backbone
+    assert sela.shares_features_with(sela_local)
+
+    descs, features = sela.get_image_descriptors_and_features(images)
+    assert backbone.calls == 1
+
+    expected_descs = sela.get_image_descriptors(images)
+    assert np.allclose(descs, expected_descs, atol=1e-5)
+    for image, feature in zip(images, features):
+        assert feature.shape == (61, 61, 128)
+        assert np.allclose(feature, sela_local.get_feature(image), atol=1e-5)
+
+
+def test_database_is_built_with_one_pass(sela):
+    """
+    Database of the VPR system sharing its model with the re-ranker should be built
+    with one backbone pass per batch and contain the outputs of the separate passes
+    """
+    sat_map = create_map(zoom=1, overlap_level=0)
+    sela_local = avl.SelaLocal(sela=sela)
+    backbone = sela.model.backbone
+    indices = range(len(sat_map))
+    global_descs, local_features, _ = calculate_descriptors(
+        sat_map, indices, sela, sela_local, batch_size=len(sat_map)
+    )
+    assert backbone.calls == 1
+
+    expected_descs, _, _ = calculate_descriptors(sat_map, indices, sela, None)
+    _, expected_features, _ = calculate_descriptors(sat_map, indices, None, sela_local)
+    for desc, expected_desc in zip(global_descs, expected_descs):
+        assert np.allclose(desc, expected_desc, atol=1e-5)
+    for feature, expected_feature in zip(local_features, expected_features):
+        assert np.allclose(feature, expected_feature, atol=1e-5)
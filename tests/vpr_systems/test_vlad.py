@@ -0,0 +1,52 @@
+import pytest
+import torch
+
+from torch.nn import functional as F
+
+from aero_vloc.vpr_systems.anyloc.models import VLAD
+
+
+def residual_vlad(descs, centers, residuals, vlad_mode, soft_temp):
+    """
+    VLAD built from the explicit residuals of every descriptor to every center
+    """
+    cos_sims = F.normalize(descs, dim=1) @ centers.T
+    if vlad_mode == "hard":
+        labels = cos_sims.argmax(dim=1)
+        cd_sums = [residuals[labels == k, k].sum(dim=0) for k in range(len(centers))]
+    else:
+        soft_assign = F.softmax(soft_temp * cos_sims, dim=1)
+        cd_sums = [
+            (soft_assign[:, k, None, None] * residuals).sum(dim=(0, 1))
+            for k in range(len(centers))
+        ]
+    return F.normalize(F.normalize(torch.stack(cd_sums), dim=1).flatten(), dim=0)
+
+
+@pytest.mark.parametrize("norm_descs", [True, False])
+@pytest.mark.parametrize("vlad_mode", ["hard", "soft"])
+def test_batched_vlad_equals_residual_vlad(tmp_path, vlad_mode, norm_descs):
+    """
+    Batched VLAD should be equal to the VLAD built from the explicit residuals
+    """
+    torch.manual_seed(0)
+    centers = F.normalize(torch.randn(8, 16), dim=1)
+    torch.save(centers, tmp_path / "centers.pt")
+    vlad = VLAD(
+        num_clusters=8,
+        c_centers_path=tmp_path / "centers.pt",
+        norm_descs=norm_descs,
+        vlad_mode=vlad_mode,
+        soft_temp=2.0,
+    )
+    vlad.fit()
+
+    # Descriptors are not normalized, so the normalization changes the residuals
+    descs = 3 * torch.randn(3, 100, 16)
+    batched = vlad.generate_batch(descs)
+    assert batched.shape == (3, 8 * 16)
+    for image_descs, image_vlad in zip(descs, batched):
+        residuals = vlad.generate_res_vec(image_descs)
+        expected = residual_vlad(image_descs, centers, residuals, vlad_mode, 2.0)
+        assert torch.allclose(image_vlad, expected, atol=1e-5)
+        assert torch.allclose(vlad.generate(image_descs), image_vlad, atol=1e-5)
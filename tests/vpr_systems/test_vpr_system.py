@@ -0,0 +1,87 @@
+import numpy as np
+import pickle
+import torch
+
+from aero_vloc.utils import VPRPreprocessor
+from aero_vloc.vpr_systems import VPRSystem
+from tests.utils import MeanColor
+
+
+def test_batched_descriptors_equal_single_descriptors():
+    """
+    Batched descriptors should be equal to the descriptors of single images.
+    Images with different shapes should be processed in different batches
+    """
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (64, 64, 3), dtype=np.uint8) for _ in range(5)]
+    images += [rng.integers(0, 256, (64, 48, 3), dtype=np.uint8) for _ in range(2)]
+    vpr_system = MeanColor()
+
+    descriptors = vpr_system.get_image_descriptors(images, batch_size=3)
+    assert vpr_system.batch_sizes == [3, 2, 2]
+    assert descriptors.shape == (7, 3)
+    assert descriptors.dtype == np.float32
+    assert descriptors.flags["C_CONTIGUOUS"]
+    for image, descriptor in zip(images, descriptors):
+        assert np.allclose(vpr_system.get_image_descriptor(image), descriptor)
+
+
+def test_interleaved_shapes_are_bucketed():
+    """
+    Images with different shapes should be grouped into full batches by shape,
+    while the descriptors keep the order of the images
+    """
+    rng = np.random.default_rng(0)
+    shapes = [(64, 64, 3), (64, 48, 3)] * 4
+    images = [rng.integers(0, 256, shape, dtype=np.uint8) for shape in shapes]
+    vpr_system = MeanColor()
+
+    descriptors = vpr_system.get_image_descriptors(images, batch_size=4)
+    assert vpr_system.batch_sizes == [4, 4]
+    for image, descriptor in zip(images, descriptors):
+        assert np.allclose(vpr_system.get_image_descriptor(image), descriptor)
+
+
+class LargeModel(VPRSystem):
+    """
+    VPR system with the large model and the model-free preprocessing
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.weights = torch.zeros(1_000_000)
+        self.preprocessor = VPRPreprocessor(64, patch_size=14)
+
+    def get_batch_descriptors(self, batch: torch.Tensor) -> np.ndarray:
+        return batch.mean(dim=(2, 3)).cpu().numpy()
+
+
+def test_preprocessor_does_not_pickle_model():
+    """
+    Preprocessing sent to the loader workers should not contain the model
+    and should crop the images to the multiples of the patch size
+    """
+    vpr_system = LargeModel()
+    preprocessor = vpr_system.get_preprocessor()
+    assert len(pickle.dumps(preprocessor)) < 10_000
+
+    image = np.random.default_rng(0).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+    tensor = pickle.loads(pickle.dumps(preprocessor))(image)
+    assert tensor.shape == (3, 42, 56)
+    assert torch.equal(tensor, vpr_system.preprocess_image(image))
+
+
+def test_batched_preprocessing_equals_single_preprocessing():
+    """
+    Descriptors of the images transformed in batches should be equal
+    to the descriptors of the images preprocessed one by one
+    """
+    rng = np.random.default_rng(0)
+    shapes = [(120, 160, 3), (160, 120, 3)] * 3
+    images = [rng.integers(0, 256, shape, dtype=np.uint8) for shape in shapes]
+    vpr_system = LargeModel()
+
+    descriptors = vpr_system.get_image_descriptors(images, batch_size=2)
+    tensors = [vpr_system.preprocess_image(image) for image in images]
+    expected = vpr_system.get_preprocessed_descriptors(tensors, batch_size=2)
+    assert np.allclose(descriptors, expected, atol=1e-6)